@@ -121,7 +121,8 @@ setup(
     package_dir={'kite': 'src'},
     package_data={'kite': ['spool/ui/*']},
     entry_points={
-        'console_scripts': ['spool = kite.spool.__main__:main'],
+        'console_scripts': ['spool = kite.spool.__main__:main',
+                            'kite_convert = kite.batch:main'],
     },
 
     ext_package='kite',
@@ -135,7 +136,8 @@ setup(
                   libraries=None,
                   runtime_library_dirs=None,
                   extra_objects=None,
-                  extra_compile_args=[] + omp_arg,
+                  extra_compile_args=['-O3', '-fno-math-errno',
+                                      '-fno-trapping-math'] + omp_arg,
                   extra_link_args=[] + omp_lib,
                   export_symbols=None,
                   swig_opts=None,
@@ -2,3 +2,5 @@
 from kite.scene import Scene, SceneTest, read  # noqa
 from kite.quadtree import Quadtree  # noqa
 from kite.covariance import Covariance  # noqa
+from kite.tiled import TiledArray  # noqa
+from kite.catalog import SceneCatalog  # noqa
@@ -0,0 +1,374 @@
+#!/bin/python
+import os
+import sys
+import time
+import logging
+import fnmatch
+import traceback
+import numpy as num
+
+from collections import deque
+from kite import scene_io
+from kite.scene import Scene, SceneConfig
+
+__all__ = ['findScenes', 'containerName', 'estimateMemory', 'convertScene',
+           'convertScenes', 'main']
+
+# Companion and output files which are never imported on their own
+companion_patterns = ['.*', '*.par', '*_par', '*.rsc', '*.xml', '*.los.*',
+                      '*.rdr.geo', '*theta*', '*phi*', '*.yml', '*.npy',
+                      '*.npz', '*.csv', '*.tile', '*.cc', '*.mli', '*.png',
+                      '*.bmp', '*.ras', '*.kml', '*.tif', '*.txt', '*.log']
+
+# Seconds a job may stay unfinished after its worker process exited,
+# before it is reported as failed
+worker_grace = 5.
+
+# Arrays of the scene's size held in memory during conversion:
+# displacement, theta, phi, masks, grids and import temporaries
+memory_layers = 8
+
+_log = logging.getLogger('kite.batch')
+
+# Queue of (filename, pid) started jobs, set in the worker processes
+_started = None
+
+
+def _physicalMemory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _hasGammaParameterFile(filename):
+    root = os.path.splitext(filename)[0]
+    return any(os.path.isfile(base + suffix)
+               for base in (filename, root) for suffix in ('.par', '_par'))
+
+
+def findScenes(path):
+    """ Find importable scenes in a directory tree
+
+    Companion files (parameter files, look vectors, kite containers, see
+    :data:`companion_patterns`) are skipped, the remaining files are
+    checked with :func:`kite.scene_io.detectFormat`. Gamma binaries carry
+    no signature, they are only accepted next to a parameter file of the
+    same stem (:file:`<binary>.par` or :file:`<stem>.par`, also with
+    ``_par``).
+
+    :param path: Directory to walk or a single file
+    :type path: str
+    :returns: Generator of ``(filename, format)`` tuples
+    :rtype: generator
+    """
+    if os.path.isfile(path):
+        walk = [(os.path.dirname(path), [], [os.path.basename(path)])]
+    else:
+        walk = os.walk(path)
+
+    for dirpath, dirnames, filenames in walk:
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+        for fn in sorted(filenames):
+            if any(fnmatch.fnmatch(fn, p) for p in companion_patterns):
+                continue
+            filename = os.path.join(dirpath, fn)
+            try:
+                module = scene_io.detectFormat(filename)
+            except ImportError:
+                continue
+            if isinstance(module, scene_io.Gamma) and\
+               not _hasGammaParameterFile(filename):
+                continue
+            yield filename, module.__class__.__name__
+
+
+def containerName(filename, root=None, outdir=None):
+    """ Native container basename for the imported ``filename``
+
+    :param filename: Imported file
+    :type filename: str
+    :param root: Root of the imported directory tree, mirrored in ``outdir``
+    :type root: str, optional
+    :param outdir: Output directory, defaults to the directory of
+        ``filename``
+    :type outdir: str, optional
+    :returns: Container basename
+    :rtype: str
+    """
+    basename = os.path.splitext(filename)[0]
+    if outdir is None:
+        return basename
+    if root is None or os.path.isfile(root):
+        return os.path.join(outdir, os.path.basename(basename))
+    return os.path.join(outdir, os.path.relpath(basename, root))
+
+
+def estimateMemory(filename, dtype='float64'):
+    """ Estimated peak memory of converting ``filename``
+
+    Assumes single precision input samples, each held as
+    :data:`memory_layers` arrays of ``dtype``.
+
+    :param filename: Imported file
+    :type filename: str
+    :param dtype: Floating point type of the scene
+    :type dtype: str
+    :returns: Memory in bytes
+    :rtype: int
+    """
+    npixels = os.path.getsize(filename) // 4
+    return npixels * num.dtype(dtype).itemsize * memory_layers
+
+
+def convertScene(filename, container, quadtree=False, covariance=False,
+                 dtype='float64', nthreads=1, log_level='WARNING'):
+    """ Import ``filename`` and save it as native kite container
+
+    Errors are returned rather than raised, to be reported by the
+    calling process.
+
+    :param filename: File to import
+    :type filename: str
+    :param container: Basename of the saved container
+    :type container: str
+    :param quadtree: Export the quadtree leafs to
+        ``<container>.quadtree.csv``
+    :type quadtree: bool
+    :param covariance: Calculate the covariance matrix, it is saved with
+        the container
+    :type covariance: bool
+    :param dtype: Floating point type of the scene,
+        see :attr:`kite.scene.SceneConfig.dtype`
+    :type dtype: str
+    :param nthreads: Threads of the covariance calculation
+    :type nthreads: int
+    :param log_level: Log level of the scene
+    :type log_level: str
+    :returns: ``(filename, container, error)``, ``error`` is ``None`` on
+        success
+    :rtype: tuple
+    """
+    try:
+        config = SceneConfig()
+        config.dtype = dtype
+        sc = Scene(config=config)
+        sc.setLogLevel(log_level)
+        sc.import_data(filename)
+
+        if covariance:
+            sc.covariance.nthreads = nthreads
+            sc.covariance.covariance_matrix
+
+        outdir = os.path.dirname(os.path.abspath(container))
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        sc.save(container)
+
+        if quadtree:
+            sc.quadtree.export('%s.quadtree.csv' % container)
+    except Exception:
+        return filename, container, traceback.format_exc()
+    return filename, container, None
+
+
+def _initWorker(started):
+    global _started
+    _started = started
+
+
+def _convertSceneTask(filename, container, kwargs):
+    _started.put((filename, os.getpid()))
+    return convertScene(filename, container, **kwargs)
+
+
+def _processAlive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def convertScenes(jobs, nworkers=0, memory_budget=None, scene_memory=None,
+                  poll_interval=.5, **kwargs):
+    """ Convert scenes in a process pool bounded by a memory budget
+
+    A job is only started while the estimated memory of all running jobs
+    stays within ``memory_budget``; a job exceeding the budget on its own
+    runs alone. Each worker process converts a single scene and is
+    replaced afterwards, returning its memory to the system.
+
+    Jobs whose worker process dies (e.g. killed for running out of
+    memory) or which raise outside of :func:`convertScene` are reported
+    as failed. Interrupting the generator terminates the pool.
+
+    :param jobs: ``(filename, container)`` tuples
+    :type jobs: list
+    :param nworkers: Number of worker processes, ``0`` uses all cores
+    :type nworkers: int
+    :param memory_budget: Memory budget in bytes, ``None`` is unbounded
+    :type memory_budget: int, optional
+    :param scene_memory: Memory of a single conversion in bytes, estimated
+        by :func:`estimateMemory` by default
+    :type scene_memory: int, optional
+    :param poll_interval: Seconds between polls of the running jobs
+    :type poll_interval: float
+    :param kwargs: Keyword arguments passed to :func:`convertScene`
+    :type kwargs: dict
+    :returns: Generator of ``(filename, container, error)`` tuples in
+        order of completion
+    :rtype: generator
+    """
+    import multiprocessing
+    from multiprocessing.queues import SimpleQueue
+
+    nworkers = nworkers or multiprocessing.cpu_count()
+    dtype = kwargs.get('dtype', 'float64')
+    queue = deque(
+        (filename, container,
+         scene_memory or estimateMemory(filename, dtype))
+        for filename, container in jobs)
+
+    # Written synchronously, a worker killed right after starting a job
+    # still has its pid registered
+    started = SimpleQueue()
+    pool = multiprocessing.Pool(nworkers, initializer=_initWorker,
+                                initargs=(started,), maxtasksperchild=1)
+    running = {}
+    try:
+        while queue or running:
+            while queue and len(running) < nworkers:
+                filename, container, memory = queue[0]
+                if running and memory_budget is not None and\
+                   sum(j['memory'] for j in running.itervalues()) + memory\
+                   > memory_budget:
+                    break
+                queue.popleft()
+                running[filename] = {
+                    'result': pool.apply_async(
+                        _convertSceneTask, (filename, container, kwargs)),
+                    'container': container,
+                    'memory': memory,
+                    'pid': None,
+                    'exited': None}
+
+            while not started.empty():
+                filename, pid = started.get()
+                if filename in running:
+                    running[filename]['pid'] = pid
+
+            timeout = poll_interval / len(running)
+            for filename, job in list(running.items()):
+                try:
+                    result = job['result'].get(timeout)
+                except multiprocessing.TimeoutError:
+                    if job['pid'] is None or _processAlive(job['pid']):
+                        continue
+                    if job['exited'] is None:
+                        job['exited'] = time.time()
+                    if time.time() - job['exited'] < worker_grace:
+                        continue
+                    result = (filename, job['container'],
+                              'Worker process %d died' % job['pid'])
+                except Exception:
+                    result = (filename, job['container'],
+                              traceback.format_exc())
+
+                del running[filename]
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(args=None):
+    '''
+    Batch converter deployed through setuptools
+    '''
+    import argparse as ap
+
+    epilog = 'kite_convert is part of the kite InSAR framework.'
+    epilog += '\nMore at http://pyrocko.org'
+    desc = 'Headless batch import of InSAR scenes to kite containers'
+    parser = ap.ArgumentParser(
+        prog='kite_convert',
+        epilog=epilog,
+        description=desc,
+        formatter_class=ap.RawTextHelpFormatter)
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='Files or directory trees to import')
+    parser.add_argument('-o', '--outdir', type=str, default=None,
+                        help='Output directory, mirrors the imported tree\n'
+                             '(default: next to the imported files)')
+    parser.add_argument('-j', '--nworkers', type=int, default=0,
+                        help='Worker processes (default: all cores)')
+    parser.add_argument('--memory', type=float, default=None,
+                        help='Memory budget of all workers in GB\n'
+                             '(default: 80%% of the physical memory)')
+    parser.add_argument('--scene-memory', type=float, default=None,
+                        help='Memory of a single conversion in GB\n'
+                             '(default: estimated from the file size)')
+    parser.add_argument('--quadtree', action='store_true', default=False,
+                        help='Export quadtree leafs '
+                             '(<container>.quadtree.csv)')
+    parser.add_argument('--covariance', action='store_true', default=False,
+                        help='Calculate and save the covariance matrix')
+    parser.add_argument('--dtype', type=str, default='float64',
+                        choices=['float64', 'float32'],
+                        help='Floating point type of the scenes')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='Overwrite existing containers')
+    parser.add_argument('--loglevel', type=str, default='INFO',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Log level')
+
+    ns = parser.parse_args(args)
+    logging.basicConfig(level=ns.loglevel)
+    _log.setLevel(ns.loglevel)
+
+    jobs = []
+    for path in ns.paths:
+        for filename, fmt in findScenes(path):
+            if filename in (f for f, _ in jobs):
+                continue
+            container = containerName(filename, path, ns.outdir)
+            if not ns.force and os.path.isfile('%s.yml' % container):
+                _log.info('Skipping %s, %s.yml exists'
+                          % (filename, container))
+                continue
+            _log.debug('Found %s scene %s' % (fmt, filename))
+            jobs.append((filename, container))
+
+    if ns.memory is not None:
+        memory_budget = ns.memory * 1e9
+    else:
+        memory_budget = _physicalMemory()
+        if memory_budget is not None:
+            memory_budget *= .8
+    scene_memory = ns.scene_memory * 1e9 if ns.scene_memory else None
+
+    _log.info('Converting %d scenes' % len(jobs))
+    nfailed = 0
+    try:
+        for iscene, (filename, container, error) in enumerate(convertScenes(
+                jobs, nworkers=ns.nworkers, memory_budget=memory_budget,
+                scene_memory=scene_memory, quadtree=ns.quadtree,
+                covariance=ns.covariance, dtype=ns.dtype)):
+            if error is None:
+                _log.info('[%d/%d] %s -> %s'
+                          % (iscene+1, len(jobs), filename, container))
+            else:
+                nfailed += 1
+                _log.error('[%d/%d] Failed to convert %s\n%s'
+                           % (iscene+1, len(jobs), filename, error))
+    except KeyboardInterrupt:
+        _log.error('Interrupted, conversion aborted')
+        sys.exit(1)
+
+    sys.exit(1 if nfailed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+#!/bin/python
+import os
+import sqlite3
+import zipfile
+import logging
+import numpy as num
+
+from collections import namedtuple
+from os import path
+from pyrocko import guts
+from kite.scene import Scene, SceneConfig, scene_layers
+
+__all__ = ['SceneCatalog', 'CatalogEntry']
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS scenes (
+    filename TEXT PRIMARY KEY,
+    mtime REAL,
+    scene_id TEXT,
+    scene_title TEXT,
+    satellite_name TEXT,
+    orbit_direction TEXT,
+    time_master REAL,
+    time_slave REAL,
+    west REAL,
+    east REAL,
+    south REAL,
+    north REAL,
+    rows INTEGER,
+    cols INTEGER);
+CREATE TABLE IF NOT EXISTS layers (
+    filename TEXT,
+    layer TEXT,
+    shape TEXT,
+    dtype TEXT,
+    PRIMARY KEY (filename, layer));
+CREATE INDEX IF NOT EXISTS scenes_time
+    ON scenes (time_master, time_slave);
+CREATE INDEX IF NOT EXISTS scenes_footprint
+    ON scenes (south, north, west, east);
+'''
+
+_entry_columns = ['filename', 'scene_id', 'scene_title', 'satellite_name',
+                  'orbit_direction', 'time_master', 'time_slave',
+                  'west', 'east', 'south', 'north', 'rows', 'cols']
+
+
+def _readHeader(fileobj):
+    version = num.lib.format.read_magic(fileobj)
+    if version == (1, 0):
+        shape, _, dtype = num.lib.format.read_array_header_1_0(fileobj)
+    else:
+        shape, _, dtype = num.lib.format.read_array_header_2_0(fileobj)
+    return shape, dtype
+
+
+def _containerFiles(basename):
+    npy = ['%s.%s.npy' % (basename, layer) for layer in scene_layers]
+    if path.isfile(npy[0]):
+        return ['%s.yml' % basename] + npy
+    return ['%s.yml' % basename, '%s.npz' % basename]
+
+
+def _layerHeaders(basename):
+    ''' Yield ``(layer, shape, dtype)`` of a container's layers from the
+    ``.npy`` headers, without reading the data. '''
+    if path.isfile('%s.%s.npy' % (basename, scene_layers[0])):
+        for layer in scene_layers:
+            with open('%s.%s.npy' % (basename, layer), 'rb') as f:
+                yield (layer,) + _readHeader(f)
+    else:
+        with zipfile.ZipFile('%s.npz' % basename) as npz:
+            for i, layer in enumerate(scene_layers):
+                with npz.open('arr_%d.npy' % i) as f:
+                    yield (layer,) + _readHeader(f)
+
+
+class CatalogEntry(namedtuple('CatalogEntry', _entry_columns + ['shapes'])):
+    """ Scene record of a :class:`~kite.catalog.SceneCatalog`
+
+    Holds the scene's metadata, the footprint (``west``, ``east``,
+    ``south``, ``north`` in degree) and ``shapes``, a dict of the layer
+    shapes.
+    """
+    __slots__ = ()
+
+    def load(self):
+        """ Load the scene container
+
+        :returns: Scene from the catalogued container
+        :rtype: :class:`~kite.Scene`
+        """
+        return Scene.load(self.filename)
+
+
+class SceneCatalog(object):
+    """ SQLite index of kite scene containers
+
+    The catalog records metadata, footprints and layer shapes of native
+    containers (see :meth:`kite.Scene.save`) and is queried by time and
+    space without touching the data files. :meth:`update` re-indexes
+    only containers which changed since the last update.
+
+    .. code-block:: python
+
+        catalog = SceneCatalog('/data/kite/catalog.sqlite')
+        catalog.update('/data/kite')
+        for entry in catalog.query(region=(95., 98., 20., 23.)):
+            scene = entry.load()
+
+    :param filename: SQLite database file, ``:memory:`` for a temporary
+        catalog
+    :type filename: str
+    """
+    def __init__(self, filename):
+        self._log = logging.getLogger('SceneCatalog')
+        self.filename = filename
+        self._db = sqlite3.connect(filename)
+        self._db.executescript(_schema)
+
+    def close(self):
+        """ Close the database """
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM scenes').fetchone()[0]
+
+    def _mtime(self, basename):
+        return max(os.stat(fn).st_mtime for fn in _containerFiles(basename))
+
+    def _insert(self, filename, mtime):
+        basename = filename[:-4]
+        config = guts.load(filename=filename)
+        if not isinstance(config, SceneConfig):
+            raise TypeError('%s is not a kite.Scene config' % filename)
+        layers = list(_layerHeaders(basename))
+        rows, cols = layers[0][1]
+
+        meta = config.meta
+        frame = config.frame
+        lats = (frame.llLat, frame.llLat + frame.dLat * rows)
+        lons = (frame.llLon, frame.llLon + frame.dLon * cols)
+
+        self._remove(filename)
+        self._db.execute(
+            'INSERT INTO scenes VALUES (%s)' % ','.join('?' * 14),
+            (filename, mtime, meta.scene_id, meta.scene_title,
+             meta.satellite_name, meta.orbit_direction,
+             meta.time_master, meta.time_slave,
+             min(lons), max(lons), min(lats), max(lats), rows, cols))
+        self._db.executemany(
+            'INSERT INTO layers VALUES (?, ?, ?, ?)',
+            [(filename, layer, ','.join(str(s) for s in shape), dtype.str)
+             for layer, shape, dtype in layers])
+
+    def _remove(self, filename):
+        self._db.execute('DELETE FROM scenes WHERE filename = ?', (filename,))
+        self._db.execute('DELETE FROM layers WHERE filename = ?', (filename,))
+
+    def update(self, dirname):
+        """ Index the containers in a directory tree
+
+        New and modified containers are (re-)indexed, judged by the
+        modification times of their files. Records of containers under
+        ``dirname`` which no longer exist are removed.
+
+        :param dirname: Directory to walk
+        :type dirname: str
+        :returns: Number of indexed and removed containers
+        :rtype: tuple
+        """
+        dirname = path.abspath(dirname)
+        prefix = path.join(dirname, '')
+        known = dict(self._db.execute(
+            'SELECT filename, mtime FROM scenes '
+            'WHERE substr(filename, 1, ?) = ?', (len(prefix), prefix)))
+
+        seen = set()
+        nindexed = 0
+        for dirpath, dirnames, filenames in os.walk(dirname):
+            files = set(filenames)
+            for fn in filenames:
+                if not fn.endswith('.yml'):
+                    continue
+                basename = fn[:-4]
+                if '%s.%s.npy' % (basename, scene_layers[0]) not in files\
+                   and '%s.npz' % basename not in files:
+                    continue
+
+                filename = path.join(dirpath, fn)
+                try:
+                    mtime = self._mtime(path.join(dirpath, basename))
+                    seen.add(filename)
+                    if known.get(filename) == mtime:
+                        continue
+                    self._insert(filename, mtime)
+                    nindexed += 1
+                except Exception as e:
+                    self._log.warning('Could not index %s: %s'
+                                      % (filename, e))
+
+        removed = set(known) - seen
+        for filename in removed:
+            self._remove(filename)
+        self._db.commit()
+
+        self._log.info('Indexed %d and removed %d containers in %s'
+                       % (nindexed, len(removed), dirname))
+        return nindexed, len(removed)
+
+    def query(self, tmin=None, tmax=None, region=None, satellite_name=None,
+              orbit_direction=None):
+        """ Query scenes by time, footprint and metadata
+
+        :param tmin: Scenes ending after ``tmin`` (timestamp)
+        :type tmin: float, optional
+        :param tmax: Scenes starting before ``tmax`` (timestamp)
+        :type tmax: float, optional
+        :param region: Scenes intersecting ``(west, east, south, north)``
+            in degree
+        :type region: tuple, optional
+        :param satellite_name: Satellite mission name
+        :type satellite_name: str, optional
+        :param orbit_direction: ``Ascending`` or ``Descending``
+        :type orbit_direction: str, optional
+        :returns: Matching scenes, ordered by ``time_master``
+        :rtype: list of :class:`~kite.catalog.CatalogEntry`
+        """
+        where = []
+        args = []
+        if tmin is not None:
+            where.append('max(time_master, time_slave) >= ?')
+            args.append(tmin)
+        if tmax is not None:
+            where.append('min(time_master, time_slave) <= ?')
+            args.append(tmax)
+        if region is not None:
+            west, east, south, north = region
+            where.append('east >= ? AND west <= ? AND '
+                         'north >= ? AND south <= ?')
+            args.extend((west, east, south, north))
+        if satellite_name is not None:
+            where.append('satellite_name = ?')
+            args.append(satellite_name)
+        if orbit_direction is not None:
+            where.append('orbit_direction = ?')
+            args.append(orbit_direction)
+        where = ' WHERE %s' % ' AND '.join(where) if where else ''
+
+        shapes = {}
+        for filename, layer, shape in self._db.execute(
+                'SELECT filename, layer, shape FROM layers '
+                'WHERE filename IN (SELECT filename FROM scenes%s)' % where,
+                args):
+            shapes.setdefault(filename, {})[layer] =\
+                tuple(int(s) for s in shape.split(',') if s)
+
+        return [CatalogEntry(*row, shapes=shapes.get(row[0], {}))
+                for row in self._db.execute(
+                    'SELECT %s FROM scenes%s ORDER BY time_master'
+                    % (', '.join(_entry_columns), where), args)]
@@ -3,15 +3,23 @@
 import numpy as num
 import scipy as sp
 import time
+from os import path
 
 import covariance_ext
 from pyrocko import guts
 from pyrocko.guts_array import Array
 from kite.meta import (Subject, property_cached,  # noqa
-                       trimMatrix, derampMatrix, squareMatrix)
+                       trimMatrix, derampMatrix, squareMatrix,
+                       IntegralImage)
+from kite.tiled import TiledArray
 
 __all__ = ['Covariance', 'CovarianceConfig']
 
+kernel_precision = {
+    'exact': 0,
+    'fast': 1,
+}
+
 noise_regimes = [
     (1./2000, num.inf),
     (1./2000, 1./500),
@@ -41,6 +49,41 @@ def modelCovariance(distance, a, b):
     return a * num.exp(-distance/b)
 
 
+def modelCovarianceAnisotropic(dE, dN, a, b_major, b_minor, azimuth):
+    """Anisotropic exponential covariance model
+
+    The distance is scaled by different correlation lengths along the
+    major axis, oriented along ``azimuth``, and the minor axis:
+
+    .. math::
+
+        cov(d_E, d_N) = a \\cdot e^{-\\sqrt{(d_u / b_{major})^2 +
+            (d_v / b_{minor})^2}}
+
+    with :math:`d_u, d_v` the separation rotated onto the major and minor
+    axes.
+
+    :param dE: Separation in easting
+    :type dE: float or :class:`numpy.ndarray`
+    :param dN: Separation in northing
+    :type dN: float or :class:`numpy.ndarray`
+    :param a: Linear model parameter
+    :type a: float
+    :param b_major: Correlation length along the major axis
+    :type b_major: float
+    :param b_minor: Correlation length along the minor axis
+    :type b_minor: float
+    :param azimuth: Azimuth of the major axis in degree, clockwise from North
+    :type azimuth: float
+    :returns: Covariance at separation ``dE, dN``
+    :rtype: :class:`numpy.ndarray`
+    """
+    az = num.deg2rad(azimuth)
+    du = dE * num.sin(az) + dN * num.cos(az)
+    dv = dE * num.cos(az) - dN * num.sin(az)
+    return a * num.exp(-num.sqrt((du/b_major)**2 + (dv/b_minor)**2))
+
+
 def modelPowerspec(k, beta, D):
     """Exponential linear model to estimate a log-linear power spectrum
 
@@ -61,6 +104,28 @@ def modelPowerspec(k, beta, D):
     return (k**beta)/D
 
 
+def jacobianModelCovariance(distance, a, b):
+    """Jacobian of :func:`~kite.covariance.modelCovariance` with respect to
+    ``a`` and ``b``
+
+    :returns: Partial derivatives, shape ``(distance.size, 2)``
+    :rtype: :class:`numpy.ndarray`
+    """
+    e = num.exp(-distance/b)
+    return num.vstack((e, a * e * distance / b**2)).T
+
+
+def jacobianModelPowerspec(k, beta, D):
+    """Jacobian of :func:`~kite.covariance.modelPowerspec` with respect to
+    ``beta`` and ``D``
+
+    :returns: Partial derivatives, shape ``(k.size, 2)``
+    :rtype: :class:`numpy.ndarray`
+    """
+    kb = k**beta
+    return num.vstack((kb * num.log(k) / D, -kb / D**2)).T
+
+
 class CovarianceConfig(guts.Object):
     noise_coord = Array.T(
         shape=(None,), dtype=num.float,
@@ -75,18 +140,65 @@ class CovarianceConfig(guts.Object):
         optional=True,
         help='Exponential covariance model; exponential decay. '
              'See :func:`~kite.covariance.modelCovariance`')
+    model_anisotropic = Array.T(
+        shape=(4,), dtype=num.float,
+        serialize_as='list',
+        optional=True,
+        help='Anisotropic covariance model; ``a, b_major, b_minor, '
+             'azimuth``. '
+             'See :func:`~kite.covariance.modelCovarianceAnisotropic`')
+    anisotropic = guts.Bool.T(
+        default=False,
+        help='Use the anisotropic covariance model for the covariance '
+             'matrices.')
     variance = guts.Float.T(
         optional=True,
         help='Variance of the model')
     adaptive_subsampling = guts.Bool.T(
         default=True,
         help='Adaptive subsampling flag for full covariance calculation.')
+    sampling_method = guts.StringChoice.T(
+        choices=['subsampling', 'montecarlo'],
+        default='subsampling',
+        help='Pixel pair sampling of the full covariance calculation, '
+             '``montecarlo`` draws ``montecarlo_samples`` random pixel pairs '
+             'per leaf pair.')
+    montecarlo_samples = guts.Int.T(
+        default=1000,
+        help='Number of random pixel pairs per leaf pair for the '
+             '``montecarlo`` sampling method.')
+    montecarlo_seed = guts.Int.T(
+        default=0,
+        help='Random seed for the ``montecarlo`` sampling method.')
+    spectral_bins = guts.Int.T(
+        default=512,
+        help='Number of radial wavenumber bins of the noise power spectrum.')
+    spectral_statistic = guts.StringChoice.T(
+        choices=['median', 'mean'],
+        default='median',
+        help='Statistic of the radial power spectrum bins.')
+    precision = guts.StringChoice.T(
+        choices=['exact', 'fast'],
+        default='exact',
+        help='Precision of the full covariance kernel, ``exact`` uses '
+             'libm exp(), ``fast`` a vectorized exponential with relative '
+             'error < 1e-8.')
     covariance_matrix = Array.T(
         optional=True,
         serialize_as='base64',
-        help='Cached covariance matrix, '
-             'see :attr:`~kite.Covariance.covariance_matrix`',
+        help='Cached covariance matrix (deprecated, loaded from legacy '
+             'configs only), see :attr:`~kite.Covariance.covariance_matrix`',
         )
+    covariance_matrix_file = guts.String.T(
+        optional=True,
+        help='Binary (.npy) file of the cached covariance matrix, relative '
+             'to the config file, '
+             'see :attr:`~kite.Covariance.covariance_matrix`')
+    covariance_cholesky_file = guts.String.T(
+        optional=True,
+        help='Binary (.npy) file of the cached Cholesky factor, relative '
+             'to the config file, '
+             'see :attr:`~kite.Covariance.covariance_matrix_cholesky`')
 
 
 class Covariance(object):
@@ -124,8 +236,13 @@ class Covariance(object):
         self._powerspec1d_cached = None
         self._powerspec2d_cached = None
         self._powerspec3d_cached = None
+        self._noise_amplitude_cached = {}
+        self._powerspec_fit_cached = {}
+        self._covariance_eigen_cached = None
+        self._noise_factor_cached = {}
         self._initialized = False
         self._nthreads = 0
+        self._covariance_matrix_error = None
         self._log = scene._log.getChild('Covariance')
 
         self.setConfig(config)
@@ -163,19 +280,31 @@ class Covariance(object):
         if config:
             self.config.a = None
             self.config.b = None
+            self.config.model_anisotropic = None
             self.config.variance = None
             self.config.covariance_matrix = None
+            self.config.covariance_matrix_file = None
+            self.config.covariance_cholesky_file = None
 
         if spectrum:
             self.structure_func = None
             self._powerspec1d_cached = None
             self._powerspec2d_cached = None
+            self._powerspec3d_cached = None
+            self._noise_amplitude_cached = {}
+            self._powerspec_fit_cached = {}
 
         self.covariance_matrix = None
+        self.covariance_matrix_cholesky = None
+        self._covariance_eigen_cached = None
+        self._noise_factor_cached = {}
+        self._covariance_matrix_error = None
         self.covariance_matrix_focal = None
         self.covariance_func = None
         self.weight_matrix = None
         self.weight_matrix_focal = None
+        self.weight_vector = None
+        self.weight_vector_focal = None
         self._initialized = False
         self.evChanged.notify()
 
@@ -265,51 +394,115 @@ class Covariance(object):
         self._noise_data = data
         self._clear()
 
+    @staticmethod
+    def _noiseScore(length, std, nan_fraction):
+        """ Noise patch score, high for large, quiet and complete windows.
+        """
+        with num.errstate(invalid='ignore', divide='ignore'):
+            nl = num.log2(length) / max(num.log2(num.nanmax(length)), 1.)
+            ns = std / num.nanmax(std)
+            score = nl * (1. - ns) * (1. - nan_fraction)
+        score[~num.isfinite(score)] = -num.inf
+        return score
+
+    def noiseWindowScores(self, rows, cols, nrows, ncols):
+        """ Score arbitrary pixel windows of :attr:`kite.Scene.displacement`
+            as noise patch candidates.
+
+        Window statistics are calculated through integral images
+        (:class:`~kite.meta.IntegralImage`), or read window by window from
+        a :class:`~kite.tiled.TiledArray` displacement. Windows do not have
+        to be aligned to the quadtree. The score rises with window size and
+        falls with the window's standard deviation and NaN fraction.
+
+        The integral images span the full scene, three ``float64`` tables
+        of its size. Quadtree nodes are scored from the cached node
+        statistics by :func:`~kite.Covariance.selectNoiseNode` instead.
+
+        :param rows: Window start rows
+        :type rows: :class:`numpy.ndarray`
+        :param cols: Window start columns
+        :type cols: :class:`numpy.ndarray`
+        :param nrows: Window heights
+        :type nrows: :class:`numpy.ndarray`
+        :param ncols: Window widths
+        :type ncols: :class:`numpy.ndarray`
+        :returns: Scores of the windows
+        :rtype: :class:`numpy.ndarray`
+        """
+        displacement = self.scene.displacement
+        if isinstance(displacement, TiledArray):
+            npixels, nvalid, std = self._windowStatsTiled(
+                displacement, rows, cols, nrows, ncols)
+        else:
+            integral = IntegralImage(displacement)
+            npixels, nvalid, _, std = integral.window(
+                rows, cols, nrows, ncols)
+
+        with num.errstate(invalid='ignore', divide='ignore'):
+            nan_fraction = 1. - nvalid / npixels
+        return self._noiseScore(num.sqrt(npixels), std, nan_fraction)
+
+    @staticmethod
+    def _windowStatsTiled(displacement, rows, cols, nrows, ncols):
+        ''' Window statistics streamed from a
+            :class:`~kite.tiled.TiledArray`, clipped to the array. '''
+        windows = [w.ravel() for w in
+                   num.broadcast_arrays(rows, cols, nrows, ncols)]
+        npixels = num.empty(windows[0].size)
+        nvalid = num.empty_like(npixels)
+        std = num.empty_like(npixels)
+
+        for iw, (r, c, nr, nc) in enumerate(zip(*windows)):
+            data = displacement[max(r, 0):max(r + nr, 0),
+                                max(c, 0):max(c + nc, 0)]
+            valid = data[~num.isnan(data)]
+            npixels[iw], nvalid[iw] = data.size, valid.size
+            std[iw] = valid.std() if valid.size else num.nan
+        return npixels, nvalid, std
+
+    def selectNoiseWindow(self, rows, cols, nrows, ncols):
+        """ Choose the best noise window from a set of pixel windows,
+            see :func:`~kite.Covariance.noiseWindowScores`.
+
+        :returns: Index of the selected window
+        :rtype: int
+        """
+        return int(num.argmax(
+            self.noiseWindowScores(rows, cols, nrows, ncols)))
+
     def selectNoiseNode(self):
         """ Choose noise node from quadtree
         the biggest :class:`~kite.quadtree.QuadNode` from
         :class:`~kite.Quadtree`.
 
+        The nodes are scored vectorized from the node statistics cached by
+        the quadtree. The node with the highest score
+
+        .. math::
+
+            \\frac{\\log_2 l}{\\log_2 l_{max}}
+            \\left(1 - \\frac{\\sigma}{\\sigma_{max}}\\right)
+            \\left(1 - f_{NaN}\\right)
+
+        is selected, i.e. a large, quiet and complete node.
+
+        .. note:: Earlier versions sorted the nodes ascending by this
+            score normalised with the maximum standard deviation instead
+            of the maximum length ``l_max``, and took the first node.
+
         :returns: A quadnode with the least signal.
         :rtype: :class:`~kite.quadtree.QuadNode`
         """
         t0 = time.time()
 
-        stdmax = max([n.std for n in self.quadtree.nodes])  # noqa
-        lmax = max([n.std for n in self.quadtree.nodes])  # noqa
-
-        def costFunction(n):
-            nl = num.log2(n.length)/num.log2(lmax)
-            ns = n.std/stdmax
-            return nl*(1.-ns)*(1.-n.nan_fraction)
-
-        nodes = sorted(self.quadtree.nodes,
-                       key=costFunction)
+        length, std, nan_fraction = self.quadtree.node_statistics
+        score = self._noiseScore(length, std, nan_fraction)
+        node = self.quadtree.nodes[int(num.argmax(score))]
 
         self._log.debug('Fetched noise from Quadtree.nodes [%0.8f s]'
                         % (time.time() - t0))
-        return nodes[0]
-
-    def _mapLeafs(self, nx, ny):
-        """ Helper function returning appropriate
-            :class:`~kite.quadtree.QuadNode` and for maintaining
-            the internal mapping with the matrices.
-
-        :param nx: matrix x position
-        :type nx: int
-        :param ny: matrix y position
-        :type ny: int
-        :returns: tuple of :class:`~kite.quadtree.QuadNode` s for ``nx``
-            and ``ny``
-        :rtype: tuple
-        """
-        leaf1 = self.quadtree.leafs[nx]
-        leaf2 = self.quadtree.leafs[ny]
-
-        self._leaf_mapping[leaf1.id] = nx
-        self._leaf_mapping[leaf2.id] = ny
-
-        return leaf1, leaf2
+        return node
 
     @property_cached
     def covariance_matrix(self):
@@ -320,18 +513,108 @@ class Covariance(object):
             size (:class:`~kite.Quadtree.nleafs` x
             :class:`~kite.Quadtree.nleafs`)
         """
-        if not isinstance(self.config.covariance_matrix, num.ndarray):
-            self.config.covariance_matrix =\
-                self._calcCovarianceMatrix(method='full')
-        elif self.config.covariance_matrix.ndim == 1:
-            try:
-                nl = self.quadtree.nleafs
-                self.config.covariance_matrix =\
-                    self.config.covariance_matrix.reshape(nl, nl)
-            except ValueError:
-                self.config.covariance = None
-                return self.covariance_matrix
-        return self.config.covariance_matrix
+        nl = self.quadtree.nleafs
+        if isinstance(self.config.covariance_matrix, num.ndarray):
+            # Legacy config, move the matrix out of the config
+            cov_matrix = self.config.covariance_matrix
+            self.config.covariance_matrix = None
+            if cov_matrix.size == nl**2:
+                return cov_matrix.reshape(nl, nl)
+
+        cov_matrix = self._loadCachedMatrix('covariance_matrix_file')
+        if cov_matrix is not None:
+            return cov_matrix
+        return self._calcCovarianceMatrix(method='full')
+
+    @property_cached
+    def covariance_matrix_cholesky(self):
+        """ Lower triangular Cholesky factor :math:`L` of
+            :attr:`~kite.Covariance.covariance_matrix`, :math:`C = LL^T`.
+
+        :type: :class:`numpy.ndarray`,
+            size (:class:`~kite.Quadtree.nleafs` x
+            :class:`~kite.Quadtree.nleafs`)
+        """
+        cholesky = self._loadCachedMatrix('covariance_cholesky_file')
+        if cholesky is not None:
+            return cholesky
+        return num.linalg.cholesky(self.covariance_matrix)
+
+    def _cacheFilename(self, filename):
+        config_dir = self.scene._config_dir
+        if config_dir is None:
+            return path.abspath(filename)
+        return path.join(config_dir, filename)
+
+    def _loadCachedMatrix(self, config_attr):
+        """ Memory map a cached matrix referenced by the config
+
+        :returns: Read-only matrix or ``None`` if the file is missing,
+            corrupt or does not match the quadtree
+        """
+        filename = getattr(self.config, config_attr)
+        if filename is None:
+            return None
+
+        nl = self.quadtree.nleafs
+        try:
+            matrix = num.load(self._cacheFilename(filename), mmap_mode='r')
+        except (IOError, ValueError):
+            self._log.warning('Could not load cached matrix %s' % filename)
+            matrix = None
+
+        if matrix is not None and matrix.shape != (nl, nl):
+            self._log.warning('Cached matrix %s does not match the quadtree'
+                              % filename)
+            matrix = None
+
+        if matrix is None:
+            setattr(self.config, config_attr, None)
+        return matrix
+
+    def _saveCachedMatrices(self, basename):
+        """ Save calculated covariance matrix and its Cholesky factor
+            to binary files ``<basename>.covariance[_cholesky].npy``
+            and reference them from the config.
+
+        :param basename: Basename of the scene config
+        :type basename: str
+        """
+        if isinstance(self.config.covariance_matrix, num.ndarray):
+            self.covariance_matrix
+
+        for attr, config_attr, suffix in (
+                ('covariance_matrix', 'covariance_matrix_file',
+                 'covariance'),
+                ('covariance_matrix_cholesky', 'covariance_cholesky_file',
+                 'covariance_cholesky')):
+            matrix = self.__dict__.get('_cached_%s' % attr, None)
+            if matrix is None:
+                matrix = self._loadCachedMatrix(config_attr)
+            if matrix is None:
+                continue
+
+            filename = '%s.%s.npy' % (basename, suffix)
+            if not (isinstance(matrix, num.memmap) and
+                    path.abspath(matrix.filename) == path.abspath(filename)):
+                self._log.debug('Saving %s to %s' % (attr, filename))
+                num.save(filename, matrix)
+            setattr(self.config, config_attr, path.basename(filename))
+
+    @property
+    def covariance_matrix_error(self):
+        """ Standard error of :attr:`~kite.Covariance.covariance_matrix`
+            estimated with the ``montecarlo`` sampling method.
+
+        ``None`` if the matrix was calculated by another sampling method or
+        loaded from the configuration.
+
+        :type: :class:`numpy.ndarray`,
+            size (:class:`~kite.Quadtree.nleafs` x
+            :class:`~kite.Quadtree.nleafs`)
+        """
+        self.covariance_matrix
+        return self._covariance_matrix_error
 
     @property_cached
     def covariance_matrix_focal(self):
@@ -389,45 +672,68 @@ class Covariance(object):
         :param method: Either ``focal`` point distances are used - this is
             quick but only an approximation.
             Or ``full``, where the full quadtree pixel distances matrices are
-            calculated , defaults to ``focal``
+            calculated , defaults to ``focal``. The pixel pairs of ``full``
+            are sampled by :attr:`CovarianceConfig.sampling_method`.
         :type method: str, optional
         :returns: Covariance matrix
         :rtype: thon:numpy.ndarray
         """
         self._initialized = True
 
-        nl = len(self.quadtree.leafs)
-        self._leaf_mapping = {}
+        leafs = self.quadtree.leafs
+        self._leaf_mapping = dict((l.id, il) for il, l in enumerate(leafs))
 
         t0 = time.time()
-        ma, mb = self.covariance_model
-        if method == 'focal':
-            dist_matrix = num.zeros((nl, nl))
-            dist_iter = num.nditer(num.triu_indices_from(dist_matrix))
+        if self.config.anisotropic:
+            ma, mb, mb_minor, azimuth = self.covariance_model_anisotropic
+            model_aniso = (mb_minor, num.deg2rad(azimuth))
+        else:
+            ma, mb = self.covariance_model
+            model_aniso = ()
 
-            for nx, ny in dist_iter:
-                leaf1, leaf2 = self._mapLeafs(nx, ny)
-                dist = self._leafFocalDistance(leaf1, leaf2)
-                dist_matrix[(nx, ny), (ny, nx)] = dist
-            cov_matrix = modelCovariance(dist_matrix, ma, mb)
+        if method == 'focal':
+            focal_points = self.quadtree.leaf_focal_points
+            dE = focal_points[:, 0, num.newaxis] \
+                - focal_points[num.newaxis, :, 0]
+            dN = focal_points[:, 1, num.newaxis] \
+                - focal_points[num.newaxis, :, 1]
+            if self.config.anisotropic:
+                cov_matrix = modelCovarianceAnisotropic(
+                    dE, dN, ma, mb, mb_minor, azimuth)
+            else:
+                cov_matrix = modelCovariance(num.sqrt(dE**2 + dN**2), ma, mb)
 
         elif method == 'full':
-            leaf_map = num.empty((len(self.quadtree.leafs), 4),
-                                 dtype=num.uint32)
-            for nl, leaf in enumerate(self.quadtree.leafs):
-                leaf, _ = self._mapLeafs(nl, nl)
-                leaf_map[nl, 0], leaf_map[nl, 1] = (leaf._slice_rows.start,
+            leaf_map = num.empty((len(leafs), 4), dtype=num.uint32)
+            for il, leaf in enumerate(leafs):
+                leaf_map[il, 0], leaf_map[il, 1] = (leaf._slice_rows.start,
                                                     leaf._slice_rows.stop)
-                leaf_map[nl, 2], leaf_map[nl, 3] = (leaf._slice_cols.start,
+                leaf_map[il, 2], leaf_map[il, 3] = (leaf._slice_cols.start,
                                                     leaf._slice_cols.stop)
 
             nleafs = self.quadtree.nleafs
-            cov_matrix = covariance_ext.covariance_matrix(
-                            self.scene.frame.gridE.filled(),
-                            self.scene.frame.gridN.filled(),
-                            leaf_map, ma, mb, self.nthreads,
-                            self.config.adaptive_subsampling)\
-                .reshape(nleafs, nleafs)
+            mask = num.ascontiguousarray(self.scene.displacement_mask)
+            if self.config.sampling_method == 'montecarlo':
+                cov_matrix, cov_error =\
+                    covariance_ext.covariance_matrix_montecarlo(
+                        self.scene.frame.E,
+                        self.scene.frame.N,
+                        mask, leaf_map, ma, mb, self.nthreads,
+                        self.config.montecarlo_samples,
+                        self.config.montecarlo_seed,
+                        *model_aniso)
+                num.fill_diagonal(cov_error, 0.)
+                self._covariance_matrix_error =\
+                    cov_error.reshape(nleafs, nleafs)
+            else:
+                cov_matrix = covariance_ext.covariance_matrix(
+                                self.scene.frame.E,
+                                self.scene.frame.N,
+                                mask, leaf_map, ma, mb, self.nthreads,
+                                self.config.adaptive_subsampling,
+                                kernel_precision[self.config.precision],
+                                *model_aniso)
+            cov_matrix = cov_matrix.reshape(nleafs, nleafs)
         else:
             raise TypeError('Covariance calculation %s method not defined!'
                             % method)
@@ -437,13 +743,6 @@ class Covariance(object):
                         (method, time.time()-t0))
         return cov_matrix
 
-    @staticmethod
-    def _leafFocalDistance(leaf1, leaf2):
-        return num.sqrt((leaf1.focal_point[0]
-                         - leaf2.focal_point[0])**2 +
-                        (leaf1.focal_point[1]
-                         - leaf2.focal_point[1])**2)
-
     def _leafMapping(self, leaf1, leaf2):
         if not isinstance(leaf1, str):
             leaf1 = leaf1.id
@@ -470,27 +769,109 @@ class Covariance(object):
         return self.covariance_matrix[self._leafMapping(leaf1, leaf2)]
 
     def getLeafWeight(self, leaf, model='focal'):
-        ''' Get the total weight of ``leaf``, which is the summation of 
+        ''' Get the total weight of ``leaf``, which is the mean of
             all single pair weights of :attr:`kite.Covariance.weight_matrix`.
 
         .. math ::
 
-            w_{x} = \\sum_i W_{x,i}
+            w_{x} = \\frac{1}{n} \\sum_i W_{x,i}
+
+        The weights are looked up from the cached
+        :attr:`~kite.Covariance.weight_vector` or
+        :attr:`~kite.Covariance.weight_vector_focal`.
 
-        :param model: ``Focal`` or ``full``, default ``focal``
-        :type model: str
         :param leaf: A leaf from :class:`~kite.Quadtree`
         :type leaf: :class:`~kite.quadtree.QuadNode`
+        :param model: ``focal`` or ``full``, default ``focal``
+        :type model: str
 
         :returns: Weight of the leaf
         :rtype: float
         '''
+        model = model.lower()
+        if model == 'focal':
+            weight_vec = self.weight_vector_focal
+        elif model == 'full':
+            weight_vec = self.weight_vector
+        else:
+            raise TypeError('Weight model %s not defined!' % model)
+
         (nl, _) = self._leafMapping(leaf, leaf)
-        weight_mat = self.weight_matrix_focal
-        return num.mean(weight_mat, axis=0)[nl]
+        return weight_vec[nl] / weight_vec.size
+
+    def _covarianceEigen(self):
+        """ Cached eigendecomposition ``(eigval, eigvec)`` of
+            :attr:`~kite.Covariance.covariance_matrix`, ascending.
+        """
+        if self._covariance_eigen_cached is None:
+            self._covariance_eigen_cached = num.linalg.eigh(
+                self.covariance_matrix)
+        return self._covariance_eigen_cached
+
+    def _covarianceEigenFactor(self, rank):
+        """ Low-rank factor :math:`F = V_r \\sqrt{\\Lambda_r}` from the
+            ``rank`` largest eigenpairs of
+            :attr:`~kite.Covariance.covariance_matrix`,
+            :math:`C \\approx FF^T`.
+
+        The eigendecomposition is cached.
+
+        :rtype: :class:`numpy.ndarray`, size (nleafs x rank)
+        """
+        eigval, eigvec = self._covarianceEigen()
+
+        eigval = eigval[::-1][:rank]
+        eigvec = eigvec[:, ::-1][:, :rank]
+        if num.any(eigval < 0.):
+            self._log.warning('Covariance matrix is not positive '
+                              'semi-definite, clipping eigenvalues')
+        return eigvec * num.sqrt(num.clip(eigval, 0., None))
+
+    def _noiseFactor(self, rank, dtype):
+        """ Colouring factor of :meth:`~kite.Covariance.syntheticNoiseLeafs`,
+            cast to ``float32`` once and cached per ``rank``.
+        """
+        dtype = num.float32 if dtype == num.float32 else num.float64
+        key = (rank, dtype)
+        if key not in self._noise_factor_cached:
+            if rank is None:
+                factor = self.covariance_matrix_cholesky
+            else:
+                factor = self._covarianceEigenFactor(rank)
+            self._noise_factor_cached[key] = factor.astype(dtype, copy=False)
+        return self._noise_factor_cached[key]
+
+    def syntheticNoiseLeafs(self, nrealizations, rank=None, seed=None,
+                            dtype=num.float64):
+        """ Correlated noise realizations in quadtree leaf space.
+
+        Standard normal vectors :math:`z` are coloured by a factor of the
+        covariance matrix, :math:`n = Fz`. By default the Cholesky factor
+        :attr:`~kite.Covariance.covariance_matrix_cholesky` is used, for
+        ``rank`` the ``rank`` leading eigenvectors.
+
+        :param nrealizations: Number of realizations
+        :type nrealizations: int
+        :param rank: Use a low-rank eigen factor, defaults to ``None``
+        :type rank: int, optional
+        :param seed: Random seed, defaults to ``None``
+        :type seed: int, optional
+        :param dtype: Data type of the noise, defaults to
+            :class:`numpy.float64`
+        :type dtype: :class:`numpy.dtype`, optional
+        :returns: Noise realizations, ordered like
+            :attr:`~kite.Quadtree.leafs`
+        :rtype: :class:`numpy.ndarray`, size (nrealizations x nleafs)
+        """
+        factor = self._noiseFactor(rank, dtype)
+
+        rstate = num.random.RandomState(seed)
+        z = rstate.standard_normal((nrealizations, factor.shape[1]))
+        z = z.astype(factor.dtype, copy=False)
+        return num.dot(z, factor.T).astype(dtype, copy=False)
 
     def syntheticNoise(self, shape=(1024, 1024), dEdN=None,
-                       anisotropic=False):
+                       anisotropic=False, seed=None):
         """Create random synthetic noise from data noise power spectrum.
         
         This function uses the power spectrum of the data noise (:attr:`noise_data`)
@@ -507,75 +888,141 @@ class Covariance(object):
         :param dEdN: The sampling distance in easting, defaults to
             (:attr:`kite.scene.Frame.dE`, :attr:`kite.scene.Frame.dN`).
         :type dE: tuple, floats
+        :param anisotropic: Shape the noise by the 2D power spectrum
+            instead of the radial spectrum, defaults to ``False``
+        :type anisotropic: bool, optional
+        :param seed: Random seed, defaults to ``None``
+        :type seed: int, optional
         :returns: synthetic noise patch
         :rtype: :class:`numpy.ndarray`
         """
-        if (shape[0] + shape[1]) % 2 != 0:
-            # self._log.warning('Patch dimensions must be even, '
-            #                   'ceiling dimensions!')
-            pass
-        nE = shape[1] + (shape[1] % 2)
-        nN = shape[0] + (shape[0] % 2)
+        return self.syntheticNoiseBatch(1, shape, dEdN, seed=seed,
+                                        anisotropic=anisotropic)[0]
+
+    def _noiseAmplitude(self, nN, nE, dE, dN, anisotropic=False):
+        """ Spectral amplitude filter for synthetic noise on the ``rfft2``
+            grid of a ``nN x nE`` patch, cached per grid.
 
-        rfield = num.random.rand(nN, nE)
-        spec = num.fft.fft2(rfield)
+        The isotropic filter is taken from the radial power spectrum, the
+        anisotropic one from the 2D power spectrum of the noise patch.
 
-        if not dEdN:
-            dE, dN = (self.scene.frame.dE, self.scene.frame.dN)
-        kE = num.fft.fftfreq(nE, dE)
+        :returns: Amplitude filter, shape ``(nN, nE//2+1)``
+        :rtype: :class:`numpy.ndarray`
+        """
+        key = (nN, nE, dE, dN, self.variance, anisotropic)
+        if key in self._noise_amplitude_cached:
+            return self._noise_amplitude_cached[key]
+
+        kE = num.fft.rfftfreq(nE, dE)
         kN = num.fft.fftfreq(nN, dN)
         k_rad = num.sqrt(kN[:, num.newaxis]**2 + kE[num.newaxis, :]**2)
 
-        amp = num.zeros_like(k_rad)
-
-        if not anisotropic:
+        if anisotropic:
+            power_interp, _, _, _, skE, skN = self.powerspecNoise3D()
+            kE, kN = num.meshgrid(num.clip(kE, skE.min(), skE.max()),
+                                  num.clip(kN, skN.min(), skN.max()))
+            amp = num.clip(power_interp.ev(kN, kE), 0., None)
+        else:
             noise_pspec, k, _, _, _, _ = self.powerspecNoise2D()
             k_bin = num.insert(k + k[0]/2, 0, 0)
 
-            for i in xrange(k.size):
-                k_min = k_bin[i]
-                k_max = k_bin[i+1]
-                r = num.logical_and(k_rad > k_min, k_rad <= k_max)
-                if i == (k.size-1):
-                    r = k_rad > k_min
-                if r.sum() == 0:
-                    continue
-                amp[r] = noise_pspec[i]
-            amp[k_rad == 0.] = self.variance
-            amp[k_rad > k.max()] = noise_pspec[num.argmax(k)]
-            amp = num.sqrt(amp * self.noise_data.size * num.pi * 4)
-
-        elif anisotropic:
-            interp_pspec, _, _, _, skE, skN = self.powerspecNoise3D()
-            kE = num.fft.fftshift(kE)
-            kN = num.fft.fftshift(kN)
-            mkE = num.logical_and(kE >= skE.min(), kE <= skE.max())
-            mkN = num.logical_and(kN >= skN.min(), kN <= skN.max())
-            mkRad = num.where(  # noqa
-                k_rad < num.sqrt(kN[mkN].max()**2 + kE[mkE].max()**2))
-            res = interp_pspec(kN[mkN, num.newaxis],
-                               kE[num.newaxis, mkE], grid=True)
-            print amp.shape, res.shape
-            print kN.size, kE.size
-            amp = res
-            amp = num.fft.fftshift(amp)
-            print amp.min(), amp.max()
-
-        spec *= amp
-        noise = num.abs(num.fft.ifft2(spec))
-        noise -= num.mean(noise)
+            # Bin i covers (k_bin[i], k_bin[i+1]], the last is open ended
+            ibin = num.searchsorted(k_bin, k_rad, side='left') - 1
+            num.clip(ibin, 0, k.size-1, out=ibin)
+            amp = noise_pspec[ibin]
+        amp[k_rad == 0.] = self.variance
+        amp = num.sqrt(amp * self.noise_data.size * num.pi * 4)
+
+        self._noise_amplitude_cached[key] = amp
+        return amp
+
+    def iterSyntheticNoise(self, nrealizations, shape=(1024, 1024),
+                           dEdN=None, seed=None, dtype=num.float64,
+                           memory_limit=256e6, anisotropic=False):
+        """ Iterate over stacks of synthetic noise realizations.
+
+        Like :meth:`~kite.Covariance.syntheticNoise`, the white noise
+        spectrum is shaped by a precomputed amplitude filter using real
+        FFTs. Realizations are generated in stacks that fit into
+        ``memory_limit``. The realizations are identical for every
+        ``memory_limit`` given the same ``seed``.
+
+        :param nrealizations: Number of noise realizations
+        :type nrealizations: int
+        :param shape: shape of the noise patches, see
+            :meth:`~kite.Covariance.syntheticNoise`
+        :type shape: tuple, optional
+        :param dEdN: The sampling distance in easting and northing,
+            defaults to
+            (:attr:`kite.scene.Frame.dE`, :attr:`kite.scene.Frame.dN`).
+        :type dEdN: tuple, floats
+        :param seed: Random seed, defaults to ``None``
+        :type seed: int, optional
+        :param dtype: Data type of the noise, defaults to
+            :class:`numpy.float64`
+        :type dtype: :class:`numpy.dtype`, optional
+        :param memory_limit: Working memory per stack in bytes,
+            defaults to 256 MB
+        :type memory_limit: float, optional
+        :param anisotropic: Shape the noise by the 2D power spectrum,
+            defaults to ``False``
+        :type anisotropic: bool, optional
+        :returns: Generator of noise stacks, shape ``(n, nN, nE)``
+        :rtype: generator
+        """
+        nE = shape[1] + (shape[1] % 2)
+        nN = shape[0] + (shape[0] % 2)
+        dE, dN = dEdN or (self.scene.frame.dE, self.scene.frame.dN)
+
+        amp = self._noiseAmplitude(nN, nE, dE, dN, anisotropic)
+        rstate = num.random.RandomState(seed)
+
+        # White noise, its real spectrum and the inverse transform
+        nbytes = nN * nE * 8 + amp.size * 16 + nN * nE * 8
+        nstack = int(max(1, min(nrealizations, memory_limit // nbytes)))
+
+        for istack in xrange(0, nrealizations, nstack):
+            n = min(nstack, nrealizations - istack)
+            spec = num.fft.rfft2(rstate.rand(n, nN, nE))
+            spec *= amp
+            noise = num.fft.irfft2(spec, s=(nN, nE))
+            del spec
+            num.abs(noise, out=noise)
+            noise -= noise.mean(axis=(1, 2))[:, num.newaxis, num.newaxis]
+            yield noise.astype(dtype, copy=False)
+
+    def syntheticNoiseBatch(self, nrealizations, shape=(1024, 1024),
+                            dEdN=None, seed=None, dtype=num.float64,
+                            memory_limit=256e6, anisotropic=False):
+        """ Stack of synthetic noise realizations, e.g. for bootstrapping.
+
+        See :meth:`~kite.Covariance.iterSyntheticNoise` for the parameters.
+
+        :returns: Noise realizations, shape ``(nrealizations, nN, nE)``
+        :rtype: :class:`numpy.ndarray`
+        """
+        nE = shape[1] + (shape[1] % 2)
+        nN = shape[0] + (shape[0] % 2)
+        noise = num.empty((nrealizations, nN, nE), dtype=dtype)
+
+        ir = 0
+        for stack in self.iterSyntheticNoise(nrealizations, shape, dEdN,
+                                             seed, dtype, memory_limit,
+                                             anisotropic):
+            noise[ir:ir+stack.shape[0]] = stack
+            ir += stack.shape[0]
         return noise
 
-    def powerspecNoise1D(self, data=None, ndeg=512, nk=512):
+    def powerspecNoise1D(self, data=None, nk=None):
         if self._powerspec1d_cached is None:
             self._powerspec1d_cached = self._powerspecNoise(
-                data, norm='1d', ndeg=ndeg, nk=nk)
+                data, norm='1d', nk=nk)
         return self._powerspec1d_cached
 
-    def powerspecNoise2D(self, data=None, ndeg=512, nk=512):
+    def powerspecNoise2D(self, data=None, nk=None):
         if self._powerspec2d_cached is None:
             self._powerspec2d_cached = self._powerspecNoise(
-                data, norm='2d', ndeg=ndeg, nk=nk)
+                data, norm='2d', nk=nk)
         return self._powerspec2d_cached
 
     def powerspecNoise3D(self, data=None):
@@ -584,13 +1031,78 @@ class Covariance(object):
                 data, norm='3d')
         return self._powerspec3d_cached
 
-    def _powerspecNoise(self, data=None, norm='1d', ndeg=512, nk=512):
+    @staticmethod
+    def _radialBinning(power_spec, k_rad, k, statistic='median'):
+        """ Radially bin a 2D power spectrum onto wavenumbers ``k``.
+
+        Every spectral sample is assigned to the nearest wavenumber of the
+        (linear) ``k`` grid, empty bins are linearly interpolated.
+
+        :param power_spec: 2D power spectrum
+        :type power_spec: :class:`numpy.ndarray`
+        :param k_rad: Radial wavenumber of ``power_spec`` samples
+        :type k_rad: :class:`numpy.ndarray`
+        :param k: Equidistant wavenumber bin centers
+        :type k: :class:`numpy.ndarray`
+        :param statistic: ``median`` or ``mean`` of the bin
+        :type statistic: str
+        :returns: Binned power at ``k``
+        :rtype: :class:`numpy.ndarray`
+        """
+        nk = k.size
+        k_rad = k_rad.ravel()
+        power_spec = power_spec.ravel()
+
+        valid = k_rad > 0.
+        k_rad = k_rad[valid]
+        power_spec = power_spec[valid]
+
+        if nk > 1:
+            ibin = num.rint((k_rad - k[0]) / (k[1] - k[0])).astype(num.intp)
+            num.clip(ibin, 0, nk-1, out=ibin)
+        else:
+            ibin = num.zeros(k_rad.size, dtype=num.intp)
+
+        counts = num.bincount(ibin, minlength=nk)
+        filled = counts > 0
+        power = num.zeros(nk)
+
+        if statistic == 'mean':
+            power[filled] = num.bincount(ibin, weights=power_spec,
+                                         minlength=nk)[filled] \
+                / counts[filled]
+        elif statistic == 'median':
+            # Sort by bin, then power - medians are read from the segments
+            order = num.lexsort((power_spec, ibin))
+            power_sorted = power_spec[order]
+            beg = num.cumsum(counts) - counts
+            c = counts[filled]
+            b = beg[filled]
+            power[filled] = .5 * (power_sorted[b + (c-1)//2] +
+                                  power_sorted[b + c//2])
+        else:
+            raise AttributeError('statistic must be either median or mean')
+
+        if not num.all(filled) and num.any(filled):
+            power[~filled] = num.interp(k[~filled], k[filled], power[filled])
+        return power
+
+    def _powerspecNoise(self, data=None, norm='1d', nk=None):
         """Get the noise power spectrum from
             :attr:`kite.Covariance.noise_data`.
 
+        The 1D and 2D spectra are radially binned, see
+        :attr:`~kite.covariance.CovarianceConfig.spectral_bins` and
+        :attr:`~kite.covariance.CovarianceConfig.spectral_statistic`.
+        ``3d`` returns a :class:`scipy.interpolate.RectBivariateSpline` of
+        the 2D spectrum.
+
         :param data: Overwrite Covariance.noise_data, defaults to `None`
         :type data: :class:`numpy.ndarray`, optional
-        :returns: `(power_spec, k, f_spectrum, kN, kE)`
+        :param nk: Number of wavenumber bins, defaults to
+            :attr:`~kite.covariance.CovarianceConfig.spectral_bins`
+        :type nk: int, optional
+        :returns: `(power_spec, k, dk, f_spectrum, kE, kN)`
         :rtype: tuple
         """
         if data is None:
@@ -599,6 +1111,8 @@ class Covariance(object):
             noise = data.copy()
         if norm not in ['1d', '2d', '3d']:
             raise AttributeError('norm must be either 1d, 2d or 3d')
+        if nk is None:
+            nk = self.config.spectral_bins
 
         # noise = squareMatrix(noise)
         shift = num.fft.fftshift
@@ -613,52 +1127,16 @@ class Covariance(object):
         k_rad = num.sqrt(kN[:, num.newaxis]**2 + kE[num.newaxis, :]**2)
         power_spec[k_rad == 0.] = 0.
 
-        power_interp = sp.interpolate.RectBivariateSpline(kN, kE, power_spec)
-
-        # def power1d(k):
-        #     theta = num.linspace(-num.pi, num.pi, ndeg, False)
-        #     power = num.empty_like(k)
-        #     for i in xrange(k.size):
-        #         kE = num.cos(theta) * k[i]
-        #         kN = num.sin(theta) * k[i]
-        #         power[i] = num.median(power_interp.ev(kN, kE)) * k[i]\
-        #             * num.pi * 4
-        #     return power
-
-        def power1d(k):
-            theta = num.linspace(-num.pi, num.pi, ndeg, False)
-            power = num.empty_like(k)
-            for i in xrange(k.size):
-                kE = num.cos(theta) * k[i]
-                kN = num.sin(theta) * k[i]
-                power[i] = num.median(power_interp.ev(kN, kE))
-            return power
-
-        def power2d(k):
-            """ Mean 2D Power works! """
-            theta = num.linspace(-num.pi, num.pi, ndeg, False)
-            power = num.empty_like(k)
-            for i in xrange(k.size):
-                kE = num.sin(theta) * k[i]
-                kN = num.cos(theta) * k[i]
-                power[i] = num.median(power_interp.ev(kN, kE))
-                # Median is more stable than the mean here
-            return power
-
-        def power3d(k):
-            return power_interp
-
-        power = power1d
-        if norm == '2d':
-            power = power2d
-        elif norm == '3d':
-            power = power3d
-
-        k_rad = num.sqrt(kN[:, num.newaxis]**2 + kE[num.newaxis, :]**2)
         k = num.linspace(k_rad[k_rad > 0].min(),
                          k_rad.max(), nk)
         dk = 1./k.min() / (2. * nk)
-        return power(k), k, dk, spectrum, kE, kN
+
+        if norm == '3d':
+            power = sp.interpolate.RectBivariateSpline(kN, kE, power_spec)
+        else:
+            power = self._radialBinning(power_spec, k_rad, k,
+                                        self.config.spectral_statistic)
+        return power, k, dk, spectrum, kE, kN
 
         # def power1Ddisc():
         #     self._log.info('Using discrete summation')
@@ -682,22 +1160,31 @@ class Covariance(object):
         # return power, k, dk, spectrum, kE, kN
 
     def _powerspecFit(self, regime=3):
-        """Fitting a function to data noise power spectrum. 
+        """Fitting a function to data noise power spectrum.
+
+        The fit is cached per ``regime`` until the noise patch changes.
         """
+        if regime in self._powerspec_fit_cached:
+            return self._powerspec_fit_cached[regime]
+
         power_spec, k, _, _, _, _ = self.powerspecNoise1D()
 
         def selectRegime(k, k1, k2):
             return num.logical_and(k > k1, k < k2)
 
-        regime = selectRegime(k, *noise_regimes[regime])
+        sel = selectRegime(k, *noise_regimes[regime])
 
         try:
-            return sp.optimize.curve_fit(modelPowerspec,
-                                         k[regime], power_spec[regime],
-                                         p0=(self.variance, 2000))
+            fit = sp.optimize.curve_fit(modelPowerspec,
+                                        k[sel], power_spec[sel],
+                                        p0=(self.variance, 2000),
+                                        jac=jacobianModelPowerspec)
         except RuntimeError:
             self._log.warning('Could not fit the powerspectrum model.')
-            return (0., 0.), 0.
+            fit = (0., 0.), 0.
+
+        self._powerspec_fit_cached[regime] = fit
+        return fit
 
     @property
     def powerspec_model(self):
@@ -782,30 +1269,84 @@ class Covariance(object):
     @property
     def covariance_model(self, regime=0):
         ''' Covariance model parameters for
-            :func:`~kite.covariance.modelCovariance` retrieved
-            from :attr:`~kite.Covariance.covarianceAnalytical`.
+            :func:`~kite.covariance.modelCovariance` fitted
+            to :attr:`~kite.Covariance.covariance_func`.
 
-        .. note:: using this function implies several several model
-            fits: fit of the spectrum and fit of the cosine transform.
-            Not sure about the consequences, if this is useful and/or 
-            meaningful
-            
         :getter: Get the parameters.
         :type: tuple, ``a`` and ``b``
         '''
         if self.config.a is None or self.config.b is None:
-            cov, d = self.covarianceAnalytical(regime)
             cov, d = self.covariance_func
             try:
                 (a, b), _ =\
                     sp.optimize.curve_fit(modelCovariance, d, cov,
-                                          p0=(.001, 500.))
+                                          p0=(.001, 500.),
+                                          jac=jacobianModelCovariance)
                 self.config.a, self.config.b = (float(a), float(b))
             except RuntimeError:
                 self._log.warning('Could not fit the covariance model')
                 self.config.a, self.config.b = (1., 1000.)
         return self.config.a, self.config.b
 
+    @property
+    def covariance_model_anisotropic(self):
+        ''' Anisotropic covariance model parameters for
+            :func:`~kite.covariance.modelCovarianceAnisotropic`.
+
+        The model is fitted to the 2D autocovariance of
+        :attr:`~kite.Covariance.noise_data`, the inverse Fourier transform
+        of its power spectrum, up to a quarter of the noise patch size.
+        The isotropic :attr:`~kite.Covariance.covariance_model` is the
+        starting model.
+
+        :getter: Get the parameters.
+        :type: tuple, ``a``, ``b_major``, ``b_minor`` and ``azimuth``
+        '''
+        if self.config.model_anisotropic is None:
+            self.config.model_anisotropic = \
+                num.array(self._fitCovarianceAnisotropic())
+        return tuple(float(p) for p in self.config.model_anisotropic)
+
+    def _fitCovarianceAnisotropic(self):
+        _, _, _, spectrum, _, _ = self.powerspecNoise1D()
+        nN, nE = spectrum.shape
+        dE, dN = self.quadtree.frame.dE, self.quadtree.frame.dN
+
+        # Wiener-Khinchin, zero lag at the center
+        acov = num.fft.fftshift(num.real(num.fft.ifft2(
+            num.abs(num.fft.ifftshift(spectrum))**2))) / spectrum.size
+        lagE = (num.arange(nE) - nE//2) * dE
+        lagN = (num.arange(nN) - nN//2) * dN
+        lagE, lagN = num.meshgrid(lagE, lagN)
+
+        sel = num.logical_and(num.abs(lagE) <= nE * dE / 4.,
+                              num.abs(lagN) <= nN * dN / 4.)
+        sel[nN//2, nE//2] = False
+
+        def model(lags, a, b_major, b_minor, azimuth):
+            return modelCovarianceAnisotropic(
+                lags[0], lags[1], a, abs(b_major), abs(b_minor), azimuth)
+
+        a, b = self.covariance_model
+        try:
+            (a, b_major, b_minor, azimuth), _ = sp.optimize.curve_fit(
+                model, (lagE[sel], lagN[sel]), acov[sel],
+                p0=(a, b, b, 0.))
+        except RuntimeError:
+            self._log.warning('Could not fit the anisotropic covariance '
+                              'model, using the isotropic model')
+            return a, b, b, 0.
+
+        b_major, b_minor = abs(b_major), abs(b_minor)
+        if b_minor > b_major:
+            b_major, b_minor = b_minor, b_major
+            azimuth += 90.
+        # A tiny negative azimuth rounds up to 180. in the modulo
+        azimuth %= 180.
+        if azimuth >= 180.:
+            azimuth -= 180.
+        return a, b_major, b_minor, azimuth
+
     @property
     def covariance_model_rms(self):
         '''
@@ -829,17 +1370,38 @@ class Covariance(object):
         power_spec, k, dk, _, _, _ = self.powerspecNoise1D()
         d = num.arange(1, power_spec.size+1) * dk
 
-        def structure_func(power_spec, d, k):
-            struc_func = num.zeros_like(k)
-            for i, d in enumerate(d):
-                for ik, tk in enumerate(k):
-                    # struc_func[i] += (1. - num.cos(tk*d))*power_spec[ik]
-                    struc_func[i] += (1. - sp.special.j0(tk*d))*power_spec[ik]
-            struc_func *= 2./1
-            return struc_func
+        return self.structureFunction(d), d
+
+    def structureFunction(self, distance, chunk_size=1024):
+        ''' Structure function at arbitrary distances, e.g. leaf pair
+            separations.
 
-        struc_func = structure_func(power_spec, d, k)
-        return struc_func, d
+        .. math::
+
+            sf(d) = 2 \\sum_k \\left(1 - J_0(k d)\\right) pow(k)
+
+        Evaluated as a matrix product over the outer product of distances
+        and :meth:`~kite.Covariance.powerspecNoise1D` wavenumbers, in chunks
+        of ``chunk_size`` distances.
+
+        :param distance: Distance(s) in meter
+        :type distance: float or :class:`numpy.ndarray`
+        :param chunk_size: Distances evaluated at once, defaults to 1024
+        :type chunk_size: int, optional
+        :returns: Structure function, shaped like ``distance``
+        :rtype: :class:`numpy.ndarray`
+        '''
+        power_spec, k, _, _, _, _ = self.powerspecNoise1D()
+
+        distance = num.asarray(distance, dtype=num.float)
+        d = distance.ravel()
+        struc_func = num.empty(d.size)
+        for i in xrange(0, d.size, chunk_size):
+            struc_func[i:i+chunk_size] = num.dot(
+                1. - sp.special.j0(num.outer(d[i:i+chunk_size], k)),
+                power_spec)
+        struc_func *= 2.
+        return struc_func.reshape(distance.shape)
 
     @property
     def variance(self):
@@ -872,19 +1434,160 @@ class Covariance(object):
             self.config.variance = float(var)
         return self.config.variance
 
-    def export_weight_matrix(self, filename):
-        """ Export the full :attr:`~kite.Covariance.weight_matrix` to an ASCII
-            file. The data can be loaded through :func:`numpy.loadtxt`.
+    def _iterWeightMatrixFactorRows(self, chunk_size):
+        """ Yields row chunks ``(row_begin, rows)`` of the inverse Cholesky
+            factor :math:`F = L^{-1}` of
+            :attr:`~kite.Covariance.covariance_matrix` :math:`C = LL^T`,
+            hence :math:`W = C^{-1} = F^TF`.
+
+        The rows are solved from the cached
+        :attr:`~kite.Covariance.covariance_matrix_cholesky`, no further
+        dense matrix is held in memory.
+        """
+        from scipy.linalg import solve_triangular
+        cholesky = self.covariance_matrix_cholesky
+        nl = cholesky.shape[0]
+        for ir in xrange(0, nl, chunk_size):
+            rhs = num.eye(nl, min(chunk_size, nl - ir), -ir)
+            # Rows of F are columns of F^T = L^{-T}
+            yield ir, solve_triangular(
+                cholesky, rhs, trans='T', lower=True,
+                overwrite_b=True, check_finite=False).T
+
+    def _iterWeightMatrixEigenFactorRows(self, chunk_size):
+        """ Yields row chunks ``(row_begin, rows)`` of the factor
+            :math:`F = \\Lambda^{-1/2} V^T` of the
+            :attr:`~kite.Covariance.weight_matrix` from the eigenpairs of
+            :attr:`~kite.Covariance.covariance_matrix`, :math:`W = F^TF`.
+
+        Eigenvalues which are not positive are dropped, their rows of
+        :math:`F` are zero and :math:`F^TF` is the pseudo-inverse.
+        """
+        eigval, eigvec = self._covarianceEigen()
+        positive = eigval > eigval.max() * eigval.size * num.finfo(float).eps
+        if not num.all(positive):
+            self._log.warning('Covariance matrix is not positive '
+                              'definite, dropping %d eigenvalues'
+                              % (eigval.size - positive.sum()))
+        scale = num.zeros_like(eigval)
+        scale[positive] = 1. / num.sqrt(eigval[positive])
+        for ir in xrange(0, eigval.size, chunk_size):
+            yield ir, eigvec[:, ir:ir+chunk_size].T \
+                * scale[ir:ir+chunk_size, num.newaxis]
+
+    def _iterWeightMatrixRows(self, chunk_size):
+        """ Yields row chunks ``(row_begin, rows)`` of the
+            :attr:`~kite.Covariance.weight_matrix` without materializing it.
+
+        The rows are solved from the cached
+        :attr:`~kite.Covariance.covariance_matrix_cholesky`,
+        :math:`W = L^{-T}L^{-1}`.
+        """
+        from scipy.linalg import solve_triangular
+        if self.__dict__.get('_cached_weight_matrix', None) is not None:
+            weight_matrix = self.weight_matrix
+            for ir in xrange(0, weight_matrix.shape[0], chunk_size):
+                yield ir, weight_matrix[ir:ir+chunk_size]
+            return
+
+        try:
+            cholesky = self.covariance_matrix_cholesky
+        except num.linalg.LinAlgError:
+            self._log.warning('Covariance matrix is not positive definite, '
+                              'falling back to the dense inverse')
+            weight_matrix = self.weight_matrix
+            for ir in xrange(0, weight_matrix.shape[0], chunk_size):
+                yield ir, weight_matrix[ir:ir+chunk_size]
+            return
+
+        # W is symmetric, rows equal the columns W I[:, ir:ir+chunk_size]
+        nl = cholesky.shape[0]
+        for ir in xrange(0, nl, chunk_size):
+            rhs = num.eye(nl, min(chunk_size, nl - ir), -ir)
+            rhs = solve_triangular(cholesky, rhs, lower=True,
+                                   overwrite_b=True, check_finite=False)
+            yield ir, solve_triangular(
+                cholesky, rhs, trans='T', lower=True,
+                overwrite_b=True, check_finite=False).T
+
+    def export_weight_matrix(self, filename, format='txt', chunk_size=1024):
+        """ Export the full :attr:`~kite.Covariance.weight_matrix`.
+
+        Formats:
+
+        * ``txt`` ASCII file, loadable through :func:`numpy.loadtxt`.
+        * ``npy`` dense matrix as :mod:`numpy` binary, loadable through
+          :func:`numpy.load` and memory-mappable (``mmap_mode='r'``).
+        * ``triu`` packed upper triangle as 1D ``npy``, row by row:
+          ``W[0, 0:], W[1, 1:], ...``.
+        * ``factor`` lower triangular factor :math:`F` as ``npy``,
+          with :math:`W = F^TF`. If the covariance matrix is not positive
+          definite the (not triangular) eigen factor is exported instead.
+
+        The binary formats are streamed in chunks of rows, solved from the
+        cached :attr:`~kite.Covariance.covariance_matrix_cholesky`; neither
+        the dense weight matrix nor its factor is held in memory. The
+        ordering by ``QuadNode.id`` is written to ``<filename>.leafs``, one
+        id per line.
 
         :param filename: path to export to
         :type filename: str
+        :param format: ``txt``, ``npy``, ``triu`` or ``factor``,
+            defaults to ``txt``
+        :type format: str, optional
+        :param chunk_size: Number of rows written at once, defaults to 1024
+        :type chunk_size: int, optional
         """
-        self._log.debug('Exporting Covariance.weight_matrix to %s' % filename)
-        header = 'Exported kite.Covariance.weight_matrix, '\
-                 'for more information visit http://pyrocko.com\n'\
-                 '\nThe matrix is symmetric and ordered by QuadNode.id:\n'
-        header += ', '.join([l.id for l in self.quadtree.leafs])
-        num.savetxt(filename, self.weight_matrix, header=header)
+        self._log.debug('Exporting Covariance.weight_matrix to %s (%s)'
+                        % (filename, format))
+        if format == 'txt':
+            header = 'Exported kite.Covariance.weight_matrix, '\
+                     'for more information visit http://pyrocko.com\n'\
+                     '\nThe matrix is symmetric and ordered by QuadNode.id:\n'
+            header += ', '.join([l.id for l in self.quadtree.leafs])
+            num.savetxt(filename, self.weight_matrix, header=header)
+            return
+
+        if format not in ('npy', 'triu', 'factor'):
+            raise AttributeError('Unknown export format %s' % format)
+
+        nl = self.quadtree.nleafs
+        with open('%s.leafs' % filename, 'w') as f:
+            f.write('\n'.join([l.id for l in self.quadtree.leafs]))
+            f.write('\n')
+
+        if format == 'npy':
+            out = num.lib.format.open_memmap(
+                filename, mode='w+', dtype=num.float64, shape=(nl, nl))
+            for ir, rows in self._iterWeightMatrixRows(chunk_size):
+                out[ir:ir+rows.shape[0]] = rows
+
+        elif format == 'triu':
+            out = num.lib.format.open_memmap(
+                filename, mode='w+', dtype=num.float64,
+                shape=(nl*(nl+1)//2,))
+            for ir, rows in self._iterWeightMatrixRows(chunk_size):
+                for irow in xrange(rows.shape[0]):
+                    i = ir + irow
+                    offset = i*nl - i*(i-1)//2
+                    out[offset:offset+nl-i] = rows[irow, i:]
+
+        elif format == 'factor':
+            try:
+                self.covariance_matrix_cholesky
+                factor_rows = self._iterWeightMatrixFactorRows(chunk_size)
+            except num.linalg.LinAlgError:
+                self._log.warning('Covariance matrix is not positive '
+                                  'definite, exporting the eigen factor')
+                factor_rows = self._iterWeightMatrixEigenFactorRows(
+                    chunk_size)
+            out = num.lib.format.open_memmap(
+                filename, mode='w+', dtype=num.float64, shape=(nl, nl))
+            for ir, rows in factor_rows:
+                out[ir:ir+rows.shape[0]] = rows
+
+        out.flush()
+        del out
 
     @property_cached
     def plot(self):
@@ -1,11 +1,18 @@
 #define NPY_NO_DEPRECATED_API 7
 #define SQR(a)  ( (a) * (a) )
 #define LOG2(a)  ( (log(a)) * 1.44269504088896340736 )
+#define LOG2E 1.44269504088896340736
+
+// Points of the second leaf processed per tile, 2 x 4 kB fit into L1
+#define TILE_SIZE 512
+// Partial sums of the fast tile kernel, one per vector lane and unroll
+#define NSUMS 8
 
 #include "Python.h"
 #include "numpy/arrayobject.h"
 #include <numpy/npy_math.h>
 
+#include <stdint.h>
 #include <sys/types.h>
 #include <unistd.h>
 #include <stdio.h>
@@ -17,12 +24,28 @@
 typedef npy_float32 float32_t;
 typedef npy_float64 float64_t;
 
+// Build the fast tile kernel for AVX2 and baseline, dispatched at runtime
+#if defined(__GNUC__) && !defined(__clang__) && defined(__x86_64__) \
+    && (__GNUC__ >= 5)
+    #define HAVE_AVX2_DISPATCH
+#endif
+
+typedef enum {
+    PRECISION_EXACT = 0,
+    PRECISION_FAST
+} precision_covariance;
+
+typedef float64_t (*tile_sum_func)(float64_t, float64_t, const float64_t*,
+                                   const float64_t*, npy_intp, float64_t);
+
 typedef enum {
     SUCCESS = 0,
-    SAUBSAMPLING_SPARSE_ERROR
+    SAUBSAMPLING_SPARSE_ERROR,
+    MEMORY_ERROR
 } state_covariance;
 
 static PyObject *CovarianceExtError;
+static tile_sum_func tile_sum_fast;
 
 int good_array(PyObject* o, int typenum, npy_intp size_want, int ndim_want, npy_intp* shape_want) {
     int i;
@@ -64,181 +87,552 @@ int good_array(PyObject* o, int typenum, npy_intp size_want, int ndim_want, npy_
     return 1;
 }
 
+static state_covariance pack_leaf_points(
+                float64_t *E,
+                float64_t *N,
+                npy_bool *mask,
+                npy_intp *shape_coord,
+                uint32_t *map,
+                npy_intp nleafs,
+                uint32_t adaptive_subsampling,
+                const float64_t *transform,
+                npy_intp *leaf_offset,
+                float64_t **packed_E,
+                float64_t **packed_N) {
+    npy_intp row_end, col_end, irow, icol, il, ip, nrows, ncols, length;
+    npy_intp *leaf_subsampling;
+    float64_t *pE, *pN;
+
+    nrows = shape_coord[0];
+    ncols = shape_coord[1];
+
+    leaf_subsampling = (npy_intp*) malloc(sizeof(npy_intp) * nleafs);
+    if (leaf_subsampling == NULL)
+        return MEMORY_ERROR;
+
+    // Fix the sampling plan: every leaf_subsampling'th column of the leaf,
+    // leafs may exceed the frame. Sparse leafs without a valid pixel on
+    // the subsampled columns fall back to full sampling.
+    leaf_offset[0] = 0;
+    for (il=0; il<nleafs; il++) {
+        row_end = map[il*4+1] < nrows ? map[il*4+1] : nrows;
+        col_end = map[il*4+3] < ncols ? map[il*4+3] : ncols;
+        length = map[il*4+1] - map[il*4+0];
+
+        leaf_subsampling[il] = 1;
+        if (adaptive_subsampling && length > 1)
+            leaf_subsampling[il] = ceil(LOG2(length));
+
+        while (1) {
+            ip = 0;
+            for (irow=map[il*4+0]; irow<row_end; irow++) {
+                for (icol=map[il*4+2]; icol<col_end; icol+=leaf_subsampling[il]) {
+                    if (! mask[irow*ncols + icol])
+                        ip++;
+                }
+            }
+            if (ip > 0 || leaf_subsampling[il] == 1)
+                break;
+            leaf_subsampling[il] = 1;
+        }
+        leaf_offset[il+1] = leaf_offset[il] + ip;
+    }
+
+    pE = (float64_t*) malloc(sizeof(float64_t) * (leaf_offset[nleafs] + 1));
+    pN = (float64_t*) malloc(sizeof(float64_t) * (leaf_offset[nleafs] + 1));
+    if (pE == NULL || pN == NULL) {
+        free(pE);
+        free(pN);
+        free(leaf_subsampling);
+        return MEMORY_ERROR;
+    }
+
+    // Pack the sampled, valid coordinates contiguously, leaf after leaf
+    for (il=0; il<nleafs; il++) {
+        row_end = map[il*4+1] < nrows ? map[il*4+1] : nrows;
+        col_end = map[il*4+3] < ncols ? map[il*4+3] : ncols;
+        ip = leaf_offset[il];
+        for (irow=map[il*4+0]; irow<row_end; irow++) {
+            for (icol=map[il*4+2]; icol<col_end; icol+=leaf_subsampling[il]) {
+                if (mask[irow*ncols + icol])
+                    continue;
+                if (transform != NULL) {
+                    pE[ip] = transform[0]*E[icol] + transform[1]*N[irow];
+                    pN[ip] = transform[2]*E[icol] + transform[3]*N[irow];
+                } else {
+                    pE[ip] = E[icol];
+                    pN[ip] = N[irow];
+                }
+                ip++;
+            }
+        }
+    }
+
+    free(leaf_subsampling);
+    *packed_E = pE;
+    *packed_N = pN;
+    return SUCCESS;
+}
+
+static inline float64_t fast_exp(float64_t x) {
+    /* exp(x) for x <= 0 through 2^n * 2^f, n = rint(x*log2(e)), |f| <= .5
+       Degree 7 Taylor polynomial of 2^f, relative error < 1e-8.
+       Branch free, inlines into vectorizable loops. The clamp is a
+       select, it vectorizes with -fno-trapping-math (fmax() does not). */
+    union { float64_t d; int64_t i; } u, r;
+    float64_t t, n, f, p;
+
+    t = x * LOG2E;
+    t = t < -1022. ? -1022. : t;
+    // Round to nearest integer, n ends up in the low mantissa bits
+    u.d = t + 6755399441055744.;
+    n = u.d - 6755399441055744.;
+    f = (t - n) * 0.69314718055994530942;
+
+    p = 1. + f * (1. + f * (1./2. + f * (1./6. + f * (1./24. + f * (1./120.
+        + f * (1./720. + f * (1./5040.)))))));
+    r.i = (u.i << 52) + ((int64_t) 1023 << 52);
+    return p * r.d;
+}
+
+static float64_t tile_sum_exact(
+                float64_t e1,
+                float64_t n1,
+                const float64_t *pE,
+                const float64_t *pN,
+                npy_intp npoints,
+                float64_t mb) {
+    npy_intp ip;
+    float64_t sum = 0.;
+
+    for (ip=0; ip<npoints; ip++) {
+        sum += exp(-sqrt(SQR(e1-pE[ip]) + SQR(n1-pN[ip])) / mb);
+    }
+    return sum;
+}
+
+// The loop has to live in the target function itself to vectorize.
+// NSUMS explicit partial sums let the compiler vectorize the reduction
+// without reassociating it, the summation order is the same for every
+// clone and does not depend on OpenMP.
+#define DEFINE_TILE_SUM_FAST(name, attributes) \
+attributes \
+static float64_t name( \
+                float64_t e1, \
+                float64_t n1, \
+                const float64_t *pE, \
+                const float64_t *pN, \
+                npy_intp npoints, \
+                float64_t mb) { \
+    npy_intp ip, is; \
+    float64_t sum[NSUMS] = {0.}, mb_inv = -1./mb; \
+    for (ip=0; ip+NSUMS<=npoints; ip+=NSUMS) { \
+        for (is=0; is<NSUMS; is++) \
+            sum[is] += fast_exp(sqrt(SQR(e1-pE[ip+is]) \
+                                     + SQR(n1-pN[ip+is])) * mb_inv); \
+    } \
+    for (is=0; ip+is<npoints; is++) \
+        sum[is] += fast_exp(sqrt(SQR(e1-pE[ip+is]) \
+                                 + SQR(n1-pN[ip+is])) * mb_inv); \
+    for (is=1; is<NSUMS; is++) \
+        sum[0] += sum[is]; \
+    return sum[0]; \
+}
+
+DEFINE_TILE_SUM_FAST(tile_sum_fast_default, )
+#if defined(HAVE_AVX2_DISPATCH)
+DEFINE_TILE_SUM_FAST(tile_sum_fast_avx2, __attribute__((target("avx2,fma"))))
+#endif
+
+static tile_sum_func get_tile_sum_fast(void) {
+#if defined(HAVE_AVX2_DISPATCH)
+    __builtin_cpu_init();
+    if (__builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma"))
+        return tile_sum_fast_avx2;
+#endif
+    return tile_sum_fast_default;
+}
+
+static float64_t leaf_pair_covariance(
+                float64_t *pE,
+                float64_t *pN,
+                npy_intp l1beg,
+                npy_intp l1end,
+                npy_intp l2beg,
+                npy_intp l2end,
+                float64_t mb,
+                precision_covariance precision) {
+    npy_intp ip1, it2, it2end;
+    float64_t cov;
+    tile_sum_func tile_sum;
+
+    if (l1end == l1beg || l2end == l2beg)
+        return NPY_NAN;
+
+    tile_sum = precision == PRECISION_FAST ? tile_sum_fast : tile_sum_exact;
+
+    // Tile the second leaf, the tile stays in L1 while we sweep the first
+    cov = 0.;
+    for (it2=l2beg; it2<l2end; it2+=TILE_SIZE) {
+        it2end = it2 + TILE_SIZE < l2end ? it2 + TILE_SIZE : l2end;
+        for (ip1=l1beg; ip1<l1end; ip1++) {
+            cov += tile_sum(pE[ip1], pN[ip1], &pE[it2], &pN[it2],
+                            it2end - it2, mb);
+        }
+    }
+    return cov / ((l1end - l1beg) * (l2end - l2beg));
+}
+
+static inline uint64_t mix64(uint64_t z) {
+    // SplitMix64 finalizer
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9ULL;
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EBULL;
+    return z ^ (z >> 31);
+}
+
+static inline uint64_t splitmix64(uint64_t *state) {
+    *state += 0x9E3779B97F4A7C15ULL;
+    return mix64(*state);
+}
+
+static void leaf_pair_covariance_montecarlo(
+                float64_t *pE,
+                float64_t *pN,
+                npy_intp l1beg,
+                npy_intp l1end,
+                npy_intp l2beg,
+                npy_intp l2end,
+                float64_t mb,
+                uint32_t nsamples,
+                uint64_t rng_state,
+                float64_t *cov,
+                float64_t *std_err) {
+    /* Mean over nsamples pixel pairs drawn uniformly with replacement,
+       std_err is the standard error of that mean. Leaf pairs holding
+       fewer pixel pairs than nsamples are summed exactly.
+       Welford's update keeps the variance accurate for strongly
+       correlated pairs, where it is small against the squared mean. */
+    npy_intp n1, n2, ip1, ip2;
+    uint32_t is;
+    float64_t c, delta, mean, m2;
+
+    n1 = l1end - l1beg;
+    n2 = l2end - l2beg;
+    if (n1 == 0 || n2 == 0) {
+        *cov = NPY_NAN;
+        *std_err = NPY_NAN;
+        return;
+    }
+
+    if ((float64_t) n1 * n2 <= nsamples) {
+        *cov = leaf_pair_covariance(pE, pN, l1beg, l1end, l2beg, l2end,
+                                    mb, PRECISION_EXACT);
+        *std_err = 0.;
+        return;
+    }
+
+    mean = 0.;
+    m2 = 0.;
+    for (is=0; is<nsamples; is++) {
+        ip1 = l1beg + splitmix64(&rng_state) % n1;
+        ip2 = l2beg + splitmix64(&rng_state) % n2;
+        c = exp(-sqrt(SQR(pE[ip1]-pE[ip2]) + SQR(pN[ip1]-pN[ip2])) / mb);
+        delta = c - mean;
+        mean += delta / (is + 1);
+        m2 += delta * (c - mean);
+    }
+
+    *cov = mean;
+    *std_err = sqrt(m2 / (nsamples - 1) / nsamples);
+}
+
 static state_covariance calc_covariance_matrix(
                 float64_t *E,
                 float64_t *N,
+                npy_bool *mask,
                 npy_intp *shape_coord,
                 uint32_t *map,
-                uint32_t nleafs,
+                npy_intp nleafs,
                 float64_t ma,
                 float64_t mb,
+                const float64_t *transform,
                 uint32_t nthreads,
                 uint32_t adaptive_subsampling,
-                float64_t *cov_arr) {
-    npy_intp l1row_beg, l1row_end, l1col_beg, l1col_end, il1row, il1col;
-    npy_intp l2row_beg, l2row_end, l2col_beg, l2col_end, il2row, il2col;
-    npy_intp icl1, icl2, nrows, ncols;
-    npy_intp il1, il2, npx, l_length;
-    uint32_t leaf_subsampling[nleafs], l1hit, l2hit, tid;
-    float64_t cov;
+                precision_covariance precision,
+                uint32_t nsamples,
+                uint64_t seed,
+                float64_t *cov_arr,
+                float64_t *stderr_arr) {
+    /* nsamples > 0 estimates each leaf pair from nsamples random pixel
+       pairs and fills stderr_arr, otherwise the mean over all (sampled)
+       pixel pairs is calculated and stderr_arr is not touched.
+       A 2x2 transform maps (E, N) onto coordinates scaled by the
+       anisotropic correlation lengths, pass mb = 1 then. */
+    npy_intp il1, il2, itask, ntasks, irow, nrowtask, ipair;
+    npy_intp *leaf_offset;
+    float64_t *pE, *pN;
+    state_covariance err;
 
-    (void) tid;
     (void) nthreads;
-    nrows = (npy_intp) shape_coord[0];
-    ncols = (npy_intp) shape_coord[1];
-
-    // Defining adaptive subsampling
-    for (il1=0; il1<nleafs; il1++) {
-        if (adaptive_subsampling) {
-            l_length = map[il1*4+1] - map[il1*4+0];
-            leaf_subsampling[il1] = ceil(LOG2(l_length));
-        } else {
-           leaf_subsampling[il1] = 1;
-        }
+
+    leaf_offset = (npy_intp*) malloc(sizeof(npy_intp) * (nleafs + 1));
+    if (leaf_offset == NULL)
+        return MEMORY_ERROR;
+
+    err = pack_leaf_points(E, N, mask, shape_coord, map, nleafs,
+                           adaptive_subsampling, transform, leaf_offset,
+                           &pE, &pN);
+    if (err != SUCCESS) {
+        free(leaf_offset);
+        return err;
     }
 
-    // printf("coord_matrix: %ldx%ld\n", nrows, ncols);
-    // printf("subsampling: %d\n", subsampling);
-    // printf("nthreads: %d\n", nthreads);
+    // Every task folds row itask with row nleafs-1-itask of the upper
+    // triangle, so all tasks hold the same number of leaf pairs. Each
+    // pair is summed by a single thread in a fixed order, the result does
+    // not depend on the number of threads or on scheduling. Random draws
+    // are seeded per leaf pair for the same reason.
+    ntasks = (nleafs + 1) / 2;
+
     Py_BEGIN_ALLOW_THREADS
     #if defined(_OPENMP)
         if (nthreads == 0)
             nthreads = omp_get_num_procs();
-        #pragma omp parallel \
-            shared (E, N, map, cov_arr, nrows, ncols, nleafs, leaf_subsampling) \
-            private (l1row_beg, l1row_end, l1col_beg, l1col_end, il1row, il1col, icl1, \
-                     l2row_beg, l2row_end, l2col_beg, l2col_end, il2row, il2col, icl2, il2, \
-                     npx, cov, l1hit, l2hit, tid) \
+        #pragma omp parallel for \
+            default (none) \
+            shared (pE, pN, leaf_offset, cov_arr, stderr_arr, nleafs, ntasks, \
+                    ma, mb, precision, nsamples, seed) \
+            private (il1, il2, irow, nrowtask, ipair) \
+            schedule (dynamic, 1) \
             num_threads (nthreads)
-        {
-            tid = omp_get_thread_num();
-            #pragma omp for schedule (dynamic)
     #endif
-        for (il1=0; il1<nleafs; il1++) {
-            l1row_beg = map[il1*4+0];
-            l1row_end = map[il1*4+1];
-            l1col_beg = map[il1*4+2];
-            l1col_end = map[il1*4+3];
-            // printf("l(%lu): %lu-%lu:%lu-%lu (ss %d)\n", il1, l1row_beg, l1row_end, l1col_beg, l1col_end, leaf_subsampling[il1]);
-            for (il2=il1; il2<nleafs; il2++) {
-                l2row_beg = map[il2*4+0];
-                l2row_end = map[il2*4+1];
-                l2col_beg = map[il2*4+2];
-                l2col_end = map[il2*4+3];
-
-                l1hit = 0;
-                l2hit = 0;
-
-                cov = 0.;
-                npx = 0;
-                while(! (l1hit && l2hit)) {
-                    // printf("tid %d :: l(%lu-%lu) :: %lu:%lu (ss %d) %lu:%lu (ss %d)\n", tid, il1, il2, (l1row_end-l1row_beg), (l1col_end-l1col_beg), leaf_subsampling[il1], (l2row_end-l2row_beg), (l2col_end-l2col_beg), leaf_subsampling[il2]);
-                    for (il1row=l1row_beg; il1row<l1row_end; il1row++) {
-                        if (il1row > nrows) continue;
-                        for (il1col=l1col_beg; il1col<l1col_end; il1col+=leaf_subsampling[il1]) {
-                            if (il1col > ncols) continue;
-                            icl1 = il1row*ncols + il1col;
-                            if (npy_isnan(E[icl1]) || npy_isnan(N[icl1])) continue;
-                            l1hit = 1;
-
-                            for (il2row=l2row_beg; il2row<l2row_end; il2row++) {
-                                if (il2row > nrows) continue;
-                                for (il2col=l2col_beg; il2col<l2col_end; il2col+=leaf_subsampling[il2]) {
-                                    if (il2col > ncols) continue;
-                                    icl2 = il2row*ncols + il2col;
-                                    if (npy_isnan(E[icl2]) || npy_isnan(N[icl2])) continue;
-                                    l2hit = 1;
-
-                                    cov += exp(-sqrt(SQR(E[icl1]-E[icl2]) + SQR(N[icl1]-N[icl2])) / mb);
-                                    npx++;
-                                }
-                            }
-                        }
+        for (itask=0; itask<ntasks; itask++) {
+            nrowtask = (itask == nleafs-1-itask) ? 1 : 2;
+            for (irow=0; irow<nrowtask; irow++) {
+                il1 = irow == 0 ? itask : nleafs-1-itask;
+                for (il2=il1; il2<nleafs; il2++) {
+                    ipair = il1*nleafs+il2;
+                    if (nsamples > 0) {
+                        leaf_pair_covariance_montecarlo(
+                            pE, pN,
+                            leaf_offset[il1], leaf_offset[il1+1],
+                            leaf_offset[il2], leaf_offset[il2+1],
+                            mb, nsamples, mix64(seed ^ mix64(ipair)),
+                            &cov_arr[ipair], &stderr_arr[ipair]);
+                        cov_arr[ipair] *= ma;
+                        stderr_arr[ipair] *= ma;
+                    } else {
+                        cov_arr[ipair] = ma * leaf_pair_covariance(
+                            pE, pN,
+                            leaf_offset[il1], leaf_offset[il1+1],
+                            leaf_offset[il2], leaf_offset[il2+1],
+                            mb, precision);
                     }
-                    #if defined(_OPENMP)
-                        #pragma omp critical
-                        {
-                    #endif
-                        if (! l1hit) {
-                            leaf_subsampling[il1] = floor(leaf_subsampling[il1]/2);
-                        }
-                        if (! l2hit) {
-                            leaf_subsampling[il2] = floor(leaf_subsampling[il2]/2);
-                        }
-                    #if defined(_OPENMP)
-                        }
-                    #endif
                 }
-                cov_arr[il1*(nleafs)+il2] = ma * (cov/npx);
-                cov_arr[il2*(nleafs)+il1] = cov_arr[il1*(nleafs)+il2];
             }
         }
+
+    // Mirror the upper triangle, avoids scattered column writes above
     #if defined(_OPENMP)
-        }
+        #pragma omp parallel for \
+            default (none) \
+            shared (cov_arr, stderr_arr, nleafs, nsamples) \
+            private (il2) \
+            schedule (static) \
+            num_threads (nthreads)
     #endif
+        for (il1=1; il1<nleafs; il1++) {
+            for (il2=0; il2<il1; il2++) {
+                cov_arr[il1*nleafs+il2] = cov_arr[il2*nleafs+il1];
+                if (nsamples > 0)
+                    stderr_arr[il1*nleafs+il2] = stderr_arr[il2*nleafs+il1];
+            }
+        }
     Py_END_ALLOW_THREADS
+
+    free(pE);
+    free(pN);
+    free(leaf_offset);
     return SUCCESS;
 }
 
-static PyObject* w_calc_covariance_matrix(PyObject *dummy, PyObject *args) {
-    PyObject *E_arr, *N_arr, *map_arr;
-    PyArrayObject *c_E_arr, *c_N_arr, *c_map_arr, *cov_arr;
+static const float64_t* anisotropic_transform(
+                float64_t *mb,
+                float64_t mb_minor,
+                float64_t azimuth,
+                float64_t *transform) {
+    /* Rotates (E, N) onto the major axis at azimuth (radians, clockwise
+       from north) and scales by the correlation lengths, the distance of
+       transformed coordinates enters exp(-d) with mb = 1.
+       Returns NULL for the isotropic model (mb_minor <= 0). */
+    if (mb_minor <= 0.)
+        return NULL;
+
+    transform[0] = sin(azimuth) / *mb;
+    transform[1] = cos(azimuth) / *mb;
+    transform[2] = cos(azimuth) / mb_minor;
+    transform[3] = -sin(azimuth) / mb_minor;
+    *mb = 1.;
+    return transform;
+}
 
-    float64_t *x, *y, *covs, ma, mb;
-    uint32_t *map, nthreads, adaptive_subsampling;
+static PyObject* w_calc_covariance_matrix(PyObject *dummy, PyObject *args) {
+    PyObject *E_arr, *N_arr, *mask_arr, *map_arr;
+    PyArrayObject *c_E_arr, *c_N_arr, *c_mask_arr, *c_map_arr, *cov_arr;
+
+    float64_t *x, *y, *covs, ma, mb, mb_minor = -1., azimuth = 0.;
+    float64_t transform_arr[4];
+    const float64_t *transform;
+    npy_bool *mask;
+    uint32_t *map, nthreads, adaptive_subsampling, precision;
     npy_intp shape_coord[2], shape_dist[2], nleafs;
     npy_intp shape_want_map[2] = {-1, 4};
     state_covariance err;
 
-    if (! PyArg_ParseTuple(args, "OOOddII", &E_arr, &N_arr, &map_arr, &ma, &mb, &nthreads, &adaptive_subsampling)) {
-        PyErr_SetString(CovarianceExtError, "usage: distances(X, Y, map, covmodel_a, covmodel_b, nthreads, adaptive_subsampling)");
+    if (! PyArg_ParseTuple(args, "OOOOddIII|dd", &E_arr, &N_arr, &mask_arr, &map_arr, &ma, &mb, &nthreads, &adaptive_subsampling, &precision, &mb_minor, &azimuth)) {
+        PyErr_SetString(CovarianceExtError, "usage: covariance_matrix(E, N, mask, map, covmodel_a, covmodel_b, nthreads, adaptive_subsampling, precision[, covmodel_b_minor, azimuth])");
         return NULL;
     }
 
-    if (! good_array(E_arr, NPY_FLOAT64, -1, 2, NULL))
+    if (precision != PRECISION_EXACT && precision != PRECISION_FAST) {
+        PyErr_SetString(CovarianceExtError, "precision must be 0 (exact) or 1 (fast)");
         return NULL;
-    if (! good_array(N_arr, NPY_FLOAT64, -1, 2, NULL))
+    }
+
+    if (! good_array(E_arr, NPY_FLOAT64, -1, 1, NULL))
+        return NULL;
+    if (! good_array(N_arr, NPY_FLOAT64, -1, 1, NULL))
+        return NULL;
+
+    shape_coord[0] = PyArray_SIZE((PyArrayObject*) N_arr);
+    shape_coord[1] = PyArray_SIZE((PyArrayObject*) E_arr);
+
+    if (! good_array(mask_arr, NPY_BOOL, -1, 2, shape_coord))
         return NULL;
     if (! good_array(map_arr, NPY_UINT32, -1, 2, shape_want_map))
         return NULL;
 
     c_E_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) E_arr);
     c_N_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) N_arr);
+    c_mask_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) mask_arr);
     c_map_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) map_arr);
 
+    x = PyArray_DATA(c_E_arr);
+    y = PyArray_DATA(c_N_arr);
+    mask = PyArray_DATA(c_mask_arr);
+    map = PyArray_DATA(c_map_arr);
+    nleafs = PyArray_SIZE(c_map_arr)/4;
+
+    shape_dist[0] = nleafs;
+    shape_dist[1] = nleafs;
+
+    cov_arr = (PyArrayObject*) PyArray_EMPTY(2, shape_dist, NPY_FLOAT64, 0);
+    covs = PyArray_DATA(cov_arr);
+
+    transform = anisotropic_transform(&mb, mb_minor, azimuth, transform_arr);
+    err = calc_covariance_matrix(x, y, mask, shape_coord, map, nleafs, ma, mb, transform, nthreads, adaptive_subsampling, (precision_covariance) precision, 0, 0, covs, NULL);
+
+    Py_DECREF(c_E_arr);
+    Py_DECREF(c_N_arr);
+    Py_DECREF(c_mask_arr);
+    Py_DECREF(c_map_arr);
 
-    if (PyArray_SIZE(c_E_arr) != PyArray_SIZE(c_N_arr)) {
-        PyErr_SetString(CovarianceExtError, "X and Y must have the same size!");
+    if (err == MEMORY_ERROR) {
+        Py_DECREF(cov_arr);
+        PyErr_SetString(PyExc_MemoryError, "Could not allocate packed leaf coordinates!");
+        return NULL;
+    } else if (err != SUCCESS) {
+        Py_DECREF(cov_arr);
+        PyErr_SetString(CovarianceExtError, "Calculating covariance failed!");
         return NULL;
     }
+    return (PyObject*) cov_arr;
+}
+
+static PyObject* w_calc_covariance_matrix_montecarlo(PyObject *dummy, PyObject *args) {
+    PyObject *E_arr, *N_arr, *mask_arr, *map_arr;
+    PyArrayObject *c_E_arr, *c_N_arr, *c_mask_arr, *c_map_arr, *cov_arr, *stderr_arr;
+
+    float64_t *x, *y, *covs, *stderrs, ma, mb, mb_minor = -1., azimuth = 0.;
+    float64_t transform_arr[4];
+    const float64_t *transform;
+    npy_bool *mask;
+    uint32_t *map, nthreads, nsamples, seed;
+    npy_intp shape_coord[2], shape_dist[2], nleafs;
+    npy_intp shape_want_map[2] = {-1, 4};
+    state_covariance err;
+
+    if (! PyArg_ParseTuple(args, "OOOOddIII|dd", &E_arr, &N_arr, &mask_arr, &map_arr, &ma, &mb, &nthreads, &nsamples, &seed, &mb_minor, &azimuth)) {
+        PyErr_SetString(CovarianceExtError, "usage: covariance_matrix_montecarlo(E, N, mask, map, covmodel_a, covmodel_b, nthreads, nsamples, seed[, covmodel_b_minor, azimuth])");
+        return NULL;
+    }
+
+    if (nsamples < 2) {
+        PyErr_SetString(CovarianceExtError, "nsamples must be at least 2");
+        return NULL;
+    }
+
+    if (! good_array(E_arr, NPY_FLOAT64, -1, 1, NULL))
+        return NULL;
+    if (! good_array(N_arr, NPY_FLOAT64, -1, 1, NULL))
+        return NULL;
+
+    shape_coord[0] = PyArray_SIZE((PyArrayObject*) N_arr);
+    shape_coord[1] = PyArray_SIZE((PyArrayObject*) E_arr);
+
+    if (! good_array(mask_arr, NPY_BOOL, -1, 2, shape_coord))
+        return NULL;
+    if (! good_array(map_arr, NPY_UINT32, -1, 2, shape_want_map))
+        return NULL;
+
+    c_E_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) E_arr);
+    c_N_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) N_arr);
+    c_mask_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) mask_arr);
+    c_map_arr = PyArray_GETCONTIGUOUS((PyArrayObject*) map_arr);
 
     x = PyArray_DATA(c_E_arr);
     y = PyArray_DATA(c_N_arr);
+    mask = PyArray_DATA(c_mask_arr);
     map = PyArray_DATA(c_map_arr);
     nleafs = PyArray_SIZE(c_map_arr)/4;
 
-    shape_coord[0] = (npy_intp) PyArray_DIMS(c_E_arr)[0];
-    shape_coord[1] = (npy_intp) PyArray_DIMS(c_E_arr)[1];
     shape_dist[0] = nleafs;
     shape_dist[1] = nleafs;
 
     cov_arr = (PyArrayObject*) PyArray_EMPTY(2, shape_dist, NPY_FLOAT64, 0);
-    // printf("size distance matrix: %lu\n", PyArray_SIZE(cov_arr));
-    // printf("size coord matrix: %lu\n", PyArray_SIZE(E_arr));
+    stderr_arr = (PyArrayObject*) PyArray_EMPTY(2, shape_dist, NPY_FLOAT64, 0);
     covs = PyArray_DATA(cov_arr);
+    stderrs = PyArray_DATA(stderr_arr);
 
-    err = calc_covariance_matrix(x, y, shape_coord, map, nleafs, ma, mb, nthreads, adaptive_subsampling, covs);
-    if (err != SUCCESS) {
+    transform = anisotropic_transform(&mb, mb_minor, azimuth, transform_arr);
+    err = calc_covariance_matrix(x, y, mask, shape_coord, map, nleafs, ma, mb, transform, nthreads, 0, PRECISION_EXACT, nsamples, seed, covs, stderrs);
+
+    Py_DECREF(c_E_arr);
+    Py_DECREF(c_N_arr);
+    Py_DECREF(c_mask_arr);
+    Py_DECREF(c_map_arr);
+
+    if (err == MEMORY_ERROR) {
+        Py_DECREF(cov_arr);
+        Py_DECREF(stderr_arr);
+        PyErr_SetString(PyExc_MemoryError, "Could not allocate packed leaf coordinates!");
+        return NULL;
+    } else if (err != SUCCESS) {
+        Py_DECREF(cov_arr);
+        Py_DECREF(stderr_arr);
         PyErr_SetString(CovarianceExtError, "Calculating covariance failed!");
         return NULL;
     }
-    return (PyObject*) cov_arr;
+    return Py_BuildValue("NN", (PyObject*) cov_arr, (PyObject*) stderr_arr);
 }
 
 static PyMethodDef CovarianceExtMethods[] = {
     {"covariance_matrix", w_calc_covariance_matrix, METH_VARARGS,
      "Calculates the covariance matrix for full resolution." },
 
+    {"covariance_matrix_montecarlo", w_calc_covariance_matrix_montecarlo, METH_VARARGS,
+     "Monte-Carlo estimate of the full resolution covariance matrix, returns (covariance, standard error)." },
+
     {NULL, NULL, 0, NULL}         /* Sentinel */
 };
 
@@ -251,6 +645,8 @@ initcovariance_ext(void)
     if (m == NULL) return;
     import_array();
 
+    tile_sum_fast = get_tile_sum_fast();
+
     CovarianceExtError = PyErr_NewException("covariance_ext.error", NULL, NULL);
     Py_INCREF(CovarianceExtError);  /* required, because other code could remove `error`
                                from the module, what would create a dangling
@@ -178,6 +178,137 @@ def formatScalar(v, ndigits=7):
     return '{value:{d}.{f}f}'.format(value=v, **f)
 
 
+def blockReduce(arr, factor, statistic='mean', chunk_lines=256, trim=False):
+    """ NaN-aware reduction of ``factor x factor`` pixel blocks.
+
+    Row chunks of ``arr`` are copied into a NaN-padded buffer and
+    reshaped into blocks, no label arrays are built. Axes of length one,
+    e.g. of per row or per column look angles, are not reduced.
+
+    :param arr: 2D array, or any object supporting ``shape``, ``dtype``
+        and slicing, such as :class:`~kite.tiled.TiledArray`
+    :type arr: :class:`numpy.ndarray`
+    :param factor: Block size in pixels
+    :type factor: int
+    :param statistic: Block statistic, ``mean`` or ``median``
+    :type statistic: str
+    :param chunk_lines: Number of input rows reduced at once, rounded to
+        a multiple of ``factor``
+    :type chunk_lines: int
+    :param trim: Drop trailing rows and columns which do not fill a
+        block, by default they are reduced over the available pixels
+    :type trim: bool
+    :returns: Reduced array
+    :rtype: :class:`numpy.ndarray`
+    """
+    import warnings
+
+    if statistic not in ('mean', 'median'):
+        raise ValueError('Unknown statistic %s' % statistic)
+    nrows, ncols = arr.shape
+    fr, fc = [factor if n > 1 else 1 for n in arr.shape]
+    if trim:
+        nr, nc = nrows // fr, ncols // fc
+    else:
+        nr, nc = -(-nrows // fr), -(-ncols // fc)
+
+    dtype = num.result_type(arr.dtype, num.float32)
+    out = num.empty((nr, nc), dtype=dtype)
+    nb_chunk = max(1, chunk_lines // fr)
+    buf = num.empty((nb_chunk * fr, nc * fc), dtype=dtype)
+    cols = min(nc * fc, ncols)
+
+    for ib in xrange(0, nr, nb_chunk):
+        nb = min(nb_chunk, nr - ib)
+        r0 = ib * fr
+        r1 = min(r0 + nb * fr, nrows)
+
+        data = buf[:nb * fr]
+        data[:r1 - r0, :cols] = arr[r0:r1, :cols]
+        data[r1 - r0:] = num.nan
+        data[:, cols:] = num.nan
+        blocks = data.reshape(nb, fr, nc, fc)
+
+        if statistic == 'mean':
+            valid = ~num.isnan(blocks)
+            count = valid.sum(axis=(1, 3))
+            with num.errstate(invalid='ignore', divide='ignore'):
+                out[ib:ib + nb] = num.where(valid, blocks, 0.).sum(
+                    axis=(1, 3), dtype=num.float64) / count
+        else:
+            blocks = blocks.transpose(0, 2, 1, 3).reshape(nb, nc, fr * fc)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                out[ib:ib + nb] = num.nanmedian(blocks, axis=2)
+    return out
+
+
+class IntegralImage(object):
+    """ Summed-area tables of valid pixel count, sum and squared sum of a 2D
+        array for constant time statistics of arbitrary rectangular windows.
+        NaN values are excluded.
+
+    :param data: 2D array
+    :type data: :class:`numpy.ndarray`
+    """
+    def __init__(self, data):
+        if data.ndim != 2:
+            raise TypeError('Data has to be 2-dim array')
+        self.shape = data.shape
+
+        valid = ~num.isnan(data)
+        # Shift by the mean to reduce cancellation in the variance
+        self.offset = num.nanmean(data) if num.any(valid) else 0.
+        shifted = num.where(valid, data - self.offset, 0.)
+
+        def table(arr):
+            tab = num.zeros((arr.shape[0] + 1, arr.shape[1] + 1))
+            num.cumsum(arr, axis=0, dtype=num.float64, out=tab[1:, 1:])
+            num.cumsum(tab[1:, 1:], axis=1, out=tab[1:, 1:])
+            return tab
+
+        self._count = table(valid.astype(num.float64))
+        self._sum = table(shifted)
+        self._sumsq = table(shifted**2)
+
+    def _windowSum(self, tab, r0, c0, r1, c1):
+        return tab[r1, c1] - tab[r0, c1] - tab[r1, c0] + tab[r0, c0]
+
+    def window(self, rows, cols, nrows, ncols):
+        """ Statistics of windows, clipped to the array.
+
+        :param rows: Window start rows
+        :type rows: :class:`numpy.ndarray`
+        :param cols: Window start columns
+        :type cols: :class:`numpy.ndarray`
+        :param nrows: Window heights
+        :type nrows: :class:`numpy.ndarray`
+        :param ncols: Window widths
+        :type ncols: :class:`numpy.ndarray`
+        :returns: Number of pixels, number of valid pixels, mean and
+            standard deviation of valid pixels in each window
+        :rtype: tuple of :class:`numpy.ndarray`
+        """
+        rows = num.asarray(rows, dtype=num.intp)
+        cols = num.asarray(cols, dtype=num.intp)
+        r0 = num.clip(rows, 0, self.shape[0])
+        c0 = num.clip(cols, 0, self.shape[1])
+        r1 = num.clip(rows + num.asarray(nrows, dtype=num.intp),
+                      0, self.shape[0])
+        c1 = num.clip(cols + num.asarray(ncols, dtype=num.intp),
+                      0, self.shape[1])
+
+        npixels = (r1 - r0) * (c1 - c0)
+        count = self._windowSum(self._count, r0, c0, r1, c1)
+        s = self._windowSum(self._sum, r0, c0, r1, c1)
+        sq = self._windowSum(self._sumsq, r0, c0, r1, c1)
+
+        with num.errstate(invalid='ignore', divide='ignore'):
+            mean = s / count
+            var = num.clip(sq / count - mean**2, 0., None)
+        return npixels, count, mean + self.offset, num.sqrt(var)
+
+
 class Subject(object):
     """
     Subject - Obsever model realization
@@ -213,9 +213,9 @@ class ScenePlot(Plot2D):
             'displacement': {'name': 'LOS Displacement',
                              'eval': lambda sc: sc.displacement},
             'theta': {'name': 'LOS Theta',
-                      'eval': lambda sc: sc.theta},
+                      'eval': lambda sc: sc.expandLook(sc.theta)},
             'phi': {'name': 'LOS Phi',
-                    'eval': lambda sc: sc.phi},
+                    'eval': lambda sc: sc.expandLook(sc.phi)},
             'dE': {'name': 'Displacement dE',
                    'eval': lambda sc: sc.cartesian.dE},
             'dN': {'name': 'Displacement dN',
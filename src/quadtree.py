@@ -3,6 +3,7 @@ import time
 from pyrocko import guts
 
 from .meta import Subject, property_cached, derampMatrix
+from .tiled import TiledArray
 
 
 class QuadNode(object):
@@ -48,7 +49,7 @@ class QuadNode(object):
         ''' Mean displacement
         :type: float
         '''
-        return num.nanmean(self.displacement)
+        return num.nanmean(self.displacement, dtype=num.float64)
 
     @property_cached
     def median(self):
@@ -62,28 +63,30 @@ class QuadNode(object):
         ''' Standard deviation of displacement
         :type: float
         '''
-        return num.nanstd(self.displacement)
+        return num.nanstd(self.displacement, dtype=num.float64)
 
     @property_cached
     def var(self):
         ''' Variance of displacement
         :type: float
         '''
-        return num.nanvar(self.displacement)
+        return num.nanvar(self.displacement, dtype=num.float64)
 
     @property_cached
     def corr_median(self):
         ''' Standard deviation of node's displacement corrected for median
         :type: float
         '''
-        return num.nanstd(self.displacement - self.median)
+        return num.nanstd(self.displacement - self.median,
+                          dtype=num.float64)
 
     @property_cached
     def corr_mean(self):
         ''' Standard deviation of node's displacement corrected for mean
         :type: float
         '''
-        return num.nanstd(self.displacement - self.mean)
+        return num.nanstd(self.displacement - self.mean,
+                          dtype=num.float64)
 
     @property_cached
     def corr_bilinear(self):
@@ -91,7 +94,8 @@ class QuadNode(object):
             trend (2D)
         :type: float
         '''
-        return num.nanstd(derampMatrix(self.displacement))
+        return num.nanstd(derampMatrix(self.displacement),
+                          dtype=num.float64)
 
     @property
     def weight(self):
@@ -133,44 +137,58 @@ class QuadNode(object):
         ''' Displacement nan mask of
             :attr:`~kite.quadtree.QuadNode.displacement`
         :type: :class:`numpy.ndarray`, dtype :class:`numpy.bool`
-
-        .. todo ::
-
-            Faster to slice Scene.displacement_mask?
         '''
-        return num.isnan(self.displacement)
+        return self.scene.displacement_mask[self._slice_rows,
+                                            self._slice_cols]
 
     @property_cached
     def phi(self):
         ''' Median Phi angle, see :class:`~kite.Scene`.
         :type: float
         '''
-        phi = self.scene.phi[self._slice_rows, self._slice_cols]
-        return num.median(phi[~self.displacement_mask])
+        return self._lookAngle(self.scene.phi)
 
     @property_cached
     def theta(self):
         ''' Median Theta angle, see :class:`~kite.Scene`.
         :type: float
         '''
-        theta = self.scene.theta[self._slice_rows, self._slice_cols]
-        return num.median(theta[~self.displacement_mask])
+        return self._lookAngle(self.scene.theta)
+
+    def _lookAngle(self, look):
+        ''' Median of constant, per row/column or full look geometry '''
+        if not isinstance(look, num.ndarray):
+            return look
+        look = look[self._slice_rows if look.shape[0] > 1 else slice(None),
+                    self._slice_cols if look.shape[1] > 1 else slice(None)]
+        if look.size == 1:
+            return float(look.flat[0])
+        look = num.broadcast_to(look, self.displacement_mask.shape)
+        return num.median(look[~self.displacement_mask])
 
     @property_cached
     def gridE(self):
         ''' Grid holding local east coordinates,
             see :attr:`kite.scene.Frame.gridE`.
-        :type: :class:`numpy.ndarray`
+        :type: :class:`numpy.ma.MaskedArray`
         '''
-        return self.scene.frame.gridE[self._slice_rows, self._slice_cols]
+        return self._maskedGrid(
+            self.scene.frame.E[num.newaxis, self._slice_cols])
 
     @property_cached
     def gridN(self):
         ''' Grid holding local north coordinates,
             see :attr:`kite.scene.Frame.gridN`.
-        :type: :class:`numpy.ndarray`
+        :type: :class:`numpy.ma.MaskedArray`
         '''
-        return self.scene.frame.gridN[self._slice_rows, self._slice_cols]
+        return self._maskedGrid(
+            self.scene.frame.N[self._slice_rows, num.newaxis])
+
+    def _maskedGrid(self, coords):
+        mask = self.displacement_mask.view()
+        mask.flags.writeable = False
+        return num.ma.masked_array(num.broadcast_to(coords, mask.shape),
+                                   mask, fill_value=num.nan)
 
     @property
     def llE(self):
@@ -362,11 +380,6 @@ class Quadtree(object):
         self.displacement = self.scene.displacement
         self.frame = self.scene.frame
 
-        # Cached matrices
-        self._leaf_matrix_means = num.empty_like(self.displacement)
-        self._leaf_matrix_medians = num.empty_like(self.displacement)
-        self._leaf_matrix_weights = num.empty_like(self.displacement)
-
         self._log = scene._log.getChild('Quadtree')
         self.setConfig(config)
 
@@ -415,6 +428,7 @@ class Quadtree(object):
         self.leaf_center_distance = None
         self.leafs = None
         self.nodes = None
+        self.node_statistics = None
         self.epsilon_min = None
         self._epsilon_init = None
         self.epsilon = self.config.epsilon or self._epsilon_init
@@ -465,7 +479,10 @@ class Quadtree(object):
     @property_cached
     def _epsilon_init(self):
         ''' Initial epsilon for virgin tree creation '''
-        return num.nanstd(self.displacement)
+        if isinstance(self.displacement, TiledArray):
+            _, _, std = self.displacement.nanstats()
+            return std
+        return num.nanstd(self.displacement, dtype=num.float64)
 
     @property_cached
     def epsilon_min(self):
@@ -556,6 +573,24 @@ class Quadtree(object):
         """
         return [n for b in self._base_nodes for n in b.iterChildren()]
 
+    @property_cached
+    def node_statistics(self):
+        """ Statistics of all nodes, vectorised for scoring and selection
+
+        Arrays of :attr:`kite.quadtree.QuadNode.length`,
+        :attr:`kite.quadtree.QuadNode.std` and
+        :attr:`kite.quadtree.QuadNode.nan_fraction`, in order of
+        :attr:`nodes`.
+
+        :getter: Get ``(length, std, nan_fraction)``
+        :type: tuple of :class:`numpy.ndarray`
+        """
+        nodes = self.nodes
+        return (num.array([n.length for n in nodes], dtype=num.float64),
+                num.array([n.std for n in nodes], dtype=num.float64),
+                num.array([n.nan_fraction for n in nodes],
+                          dtype=num.float64))
+
     @property
     def nnodes(self):
         """
@@ -655,6 +690,18 @@ class Quadtree(object):
         """
         return num.array([l.theta for l in self.leafs])
 
+    @property_cached
+    def _leaf_matrix_means(self):
+        return num.empty(self.displacement.shape)
+
+    @property_cached
+    def _leaf_matrix_medians(self):
+        return num.empty(self.displacement.shape)
+
+    @property_cached
+    def _leaf_matrix_weights(self):
+        return num.empty(self.displacement.shape)
+
     @property
     def leaf_matrix_means(self):
         """
@@ -9,11 +9,14 @@ from datetime import datetime as dt
 from .quadtree import QuadtreeConfig
 from .covariance import CovarianceConfig
 from .meta import Subject, property_cached, greatCircleDistance
+from .tiled import TiledArray
 from . import scene_io
 from os import path
 
 logging.basicConfig(level=20)
 
+scene_layers = ['displacement', 'theta', 'phi']
+
 
 def read(filename):
     scene = Scene()
@@ -32,9 +35,48 @@ def read(filename):
 
 def _setDataNumpy(obj, variable, value):
     if isinstance(value, num.ndarray):
+        return obj.__setattr__(variable,
+                               value.astype(obj.dtype, copy=False))
+    elif isinstance(value, TiledArray):
         return obj.__setattr__(variable, value)
     else:
-        raise TypeError('value must be of type numpy.ndarray')
+        raise TypeError('value must be of type numpy.ndarray'
+                        ' or kite.tiled.TiledArray')
+
+
+def _containerBasename(filename):
+    ''' Strip known kite container extensions from ``filename`` '''
+    basename, ext = path.splitext(filename)
+    if ext == '.npy':
+        basename, ext = path.splitext(basename)
+        if ext[1:] not in scene_layers:
+            basename += ext
+    elif ext not in ('.yml', '.npz'):
+        basename = filename
+    return basename
+
+
+def _loadContainerLayers(basename):
+    ''' Yield ``(layer, data)`` of a kite container, memory-mapping the
+    native ``.npy`` layers and falling back to a legacy ``.npz``. '''
+    if path.isfile('%s.%s.npy' % (basename, scene_layers[0])):
+        for layer in scene_layers:
+            yield layer, num.load('%s.%s.npy' % (basename, layer),
+                                  mmap_mode='c')
+    else:
+        data = num.load('%s.npz' % basename)
+        for i, layer in enumerate(scene_layers):
+            yield layer, data['arr_%d' % i]
+
+
+def _setLookAngle(obj, variable, value):
+    ''' Look angles are constant, per row ``(N, 1)``, per column ``(1, M)``
+    or full ``(N, M)`` '''
+    if num.isscalar(value) or num.ndim(value) == 0:
+        return obj.__setattr__(variable, float(value))
+    elif num.ndim(value) != 2:
+        raise TypeError('Look angles must be scalar or 2-dim arrays')
+    return _setDataNumpy(obj, variable, value)
 
 
 class UserIOWarning(UserWarning):
@@ -184,25 +226,36 @@ class Frame(object):
     def gridE(self):
         """ UTM grid holding eastings of all pixels in ``NxM`` matrix
             of :attr:`~kite.Scene.displacement`.
-            
-        :type: :class:`numpy.ndarray`, size ``NxM``
+
+        The grid is a read-only broadcast view of :attr:`E`, masked by a
+        read-only view of :attr:`kite.Scene.displacement_mask`; no ``NxM``
+        coordinate array is allocated. Call ``unshare_mask()`` before
+        changing the mask.
+
+        :type: :class:`numpy.ma.MaskedArray`, size ``NxM``
         """
-        valid_data = num.isnan(self._scene.displacement)
-        gridE = num.repeat(self.E[num.newaxis, :],
-                           self.rows, axis=0)
-        return num.ma.masked_array(gridE, valid_data, fill_value=num.nan)
+        return self._maskedGrid(self.E[num.newaxis, :])
 
     @property_cached
     def gridN(self):
         """ UTM grid holding northings of all pixels in ``NxM`` matrix
             of :attr:`~kite.Scene.displacement`.
-            
-        :type: :class:`numpy.ndarray`, size ``NxM``
+
+        The grid is a read-only broadcast view of :attr:`N`, masked by a
+        read-only view of :attr:`kite.Scene.displacement_mask`; no ``NxM``
+        coordinate array is allocated. Call ``unshare_mask()`` before
+        changing the mask.
+
+        :type: :class:`numpy.ma.MaskedArray`, size ``NxM``
         """
-        valid_data = num.isnan(self._scene.displacement)
-        gridN = num.repeat(self.N[:, num.newaxis],
-                           self.cols, axis=1)
-        return num.ma.masked_array(gridN, valid_data, fill_value=num.nan)
+        return self._maskedGrid(self.N[:, num.newaxis])
+
+    def _maskedGrid(self, coords):
+        grid = num.broadcast_to(coords, (self.rows, self.cols))
+        # The scene's mask is shared, guard it against in-place changes
+        mask = num.asarray(self._scene.displacement_mask).view()
+        mask.flags.writeable = False
+        return num.ma.masked_array(grid, mask, fill_value=num.nan)
 
     def setENOffset(self, east, north):
         """Set scene offsets in local cartesian coordinates.
@@ -320,6 +373,11 @@ class SceneConfig(guts.Object):
     covariance = CovarianceConfig.T(
         default=CovarianceConfig(),
         help='Covariance parameters')
+    dtype = guts.StringChoice.T(
+        choices=['float64', 'float32'],
+        default='float64',
+        help='Floating point type of displacement, look angles and'
+             ' LOS unit vectors')
 
 
 def dynamicmethod(func):
@@ -349,6 +407,7 @@ class Scene(object):
         self._displacement = None
         self._phi = None
         self._theta = None
+        self._config_dir = None
         self.cols = 0
         self.rows = 0
         self.los = LOSUnitVectors(scene=self)
@@ -374,13 +433,41 @@ class Scene(object):
 
         self.setLogLevel = self._log_stream.setLevel
 
+    @property
+    def dtype(self):
+        """ Floating point type of :attr:`~kite.Scene.displacement`,
+            :attr:`~kite.Scene.theta`, :attr:`~kite.Scene.phi` and the
+            LOS unit vectors, see :attr:`kite.scene.SceneConfig.dtype`.
+
+        Arrays are converted on assignment. ``float32`` halves memory
+        and bandwidth, reductions over the data accumulate in
+        ``float64``. Frame coordinates stay ``float64``.
+
+        :setter: Set the dtype and convert the scene's arrays.
+        :type: :class:`numpy.dtype`
+        """
+        return num.dtype(self.config.dtype)
+
+    @dtype.setter
+    def dtype(self, value):
+        self.config.dtype = num.dtype(value).name
+        for comp in ('displacement', 'theta', 'phi'):
+            arr = getattr(self, comp)
+            if isinstance(arr, num.ndarray):
+                setattr(self, comp, arr)
+
     @property
     def displacement(self):
         """ Geodetical displacement in *meter*.
 
+        Scenes larger than memory can be set as
+        :class:`~kite.tiled.TiledArray`, quadtree statistics, covariance
+        noise patches and downsampling then stream over the tiles.
+
         :setter: Set the unwrapped InSAR displacement.
         :getter: Return the displacement matrix.
-        :type: :class:`numpy.ndarray`, ``NxM``
+        :type: :class:`numpy.ndarray` or :class:`~kite.tiled.TiledArray`,
+            ``NxM``
         """
         return self._displacement
 
@@ -395,8 +482,11 @@ class Scene(object):
     def displacement_mask(self):
         """ Displacement :attr:`numpy.nan` mask
         
-        :type: :class:`numpy.ndarray`, dtype :class:`numpy.bool`
+        :type: :class:`numpy.ndarray`, dtype :class:`numpy.bool`, or
+            :class:`~kite.tiled.TiledArray` for tiled displacements
         """
+        if isinstance(self.displacement, TiledArray):
+            return self.displacement.map(num.isnan, dtype=num.bool_)
         return num.isnan(self.displacement)
 
     @property
@@ -411,19 +501,21 @@ class Scene(object):
             * :math:`0` is **East**
             * :math:`\\frac{\\pi}{2}` is **North**!
 
-        :setter: Set the phi matrix for scene's displacement, can be int
+        The look geometry can be constant (float), vary per row
+        (``Nx1``), per column (``1xM``) or be a full ``NxM`` matrix. Use
+        :meth:`~kite.Scene.expandLook` for a raster view.
+
+        :setter: Set the phi matrix for scene's displacement, can be float
                  for static look vector.
-        :type: :class:`numpy.ndarray`, size same as
-               :attr:`~kite.Scene.displacement` or int
+        :type: float or :class:`numpy.ndarray`, broadcastable to
+               :attr:`~kite.Scene.displacement`
         """
         return self._phi
 
     @phi.setter
     def phi(self, value):
-        if isinstance(value, float):
-            self._phi = value
-        else:
-            _setDataNumpy(self, '_phi', value)
+        _setLookAngle(self, '_phi', value)
+        self.phiDeg = None
         self.evChanged.notify()
 
     @property
@@ -439,39 +531,55 @@ class Scene(object):
             * :math:`-\\frac{\\pi}{2}` is **Down**
             * :math:`\\frac{\\pi}{2}` is **Up**
 
-        :setter: Set the theta matrix for scene's displacement, can be int
+        The look geometry can be constant (float), vary per row
+        (``Nx1``), per column (``1xM``) or be a full ``NxM`` matrix. Use
+        :meth:`~kite.Scene.expandLook` for a raster view.
+
+        :setter: Set the theta matrix for scene's displacement, can be float
                  for static look vector.
-        :type: :class:`numpy.ndarray`, size same as
-               :attr:`~kite.Scene.displacement` or int
+        :type: float or :class:`numpy.ndarray`, broadcastable to
+               :attr:`~kite.Scene.displacement`
         """
         return self._theta
 
     @theta.setter
     def theta(self, value):
-        if isinstance(value, float):
-            self._theta = value
-        else:
-            _setDataNumpy(self, '_theta', value)
+        _setLookAngle(self, '_theta', value)
+        self.thetaDeg = None
         self.evChanged.notify()
 
     @property_cached
     def thetaDeg(self):
-        """ LOS elevation angle in degree, ``NxM`` matrix like
+        """ LOS elevation angle in degree, same geometry as
             :class:`kite.Scene.theta`
             
-        :type: :class:`numpy.ndarray`
+        :type: float or :class:`numpy.ndarray`
         """
         return num.rad2deg(self.theta)
 
     @property_cached
     def phiDeg(self):
-        """ LOS horizontal orientation angle in degree, ``NxM`` matrix like
-            :class:`kite.Scene.theta`
+        """ LOS horizontal orientation angle in degree, same geometry as
+            :class:`kite.Scene.phi`
             
-        :type: :class:`numpy.ndarray`
+        :type: float or :class:`numpy.ndarray`
         """
         return num.rad2deg(self.phi)
 
+    def expandLook(self, value):
+        """ Broadcast look geometry, e.g. :attr:`~kite.Scene.theta` or
+            :attr:`~kite.scene.LOSUnitVectors.unitE`, to the shape of
+            :attr:`~kite.Scene.displacement`.
+
+        Constant and per row/column geometry is not copied, the result is
+        a read-only view.
+
+        :param value: Look geometry
+        :type value: float or :class:`numpy.ndarray`
+        :rtype: :class:`numpy.ndarray`, ``NxM``
+        """
+        return num.broadcast_to(value, (self.rows, self.cols))
+
     @property_cached
     def quadtree(self):
         """ Instanciates the scene's quadtree.
@@ -532,7 +640,9 @@ class Scene(object):
         Saves the current scene meta information and UTM frame to a YAML
         (``.yml``) file. Numerical data (:attr:`~kite.Scene.displacement`,
         :attr:`~kite.Scene.theta` and :attr:`~kite.Scene.phi`)
-        are saved as binary files from :class:`numpy.ndarray`.
+        are saved as uncompressed binary layers
+        ``<filename>.<layer>.npy``, which can be memory-mapped by
+        :meth:`~kite.Scene.load`.
 
         :param filename: Filenames to save scene to, defaults to
             ' :attr:`~kite.Scene.meta.scene_id` ``_``
@@ -541,44 +651,67 @@ class Scene(object):
         """
         filename = filename or '%s_%s' % (self.meta.scene_id,
                                           self.meta.scene_view)
-        _file, ext = path.splitext(filename)
-        filename = _file if ext in ['yml', 'npz'] else filename
+        filename = _containerBasename(filename)
 
-        components = ['displacement', 'theta', 'phi']
-        self._log.info('Saving scene data to %s.npz' % filename)
+        self._log.info('Saving scene data to %s.{%s}.npy'
+                       % (filename, ','.join(scene_layers)))
 
-        num.savez('%s.npz' % (filename),
-                  *[getattr(self, arr) for arr in components])
+        for layer in scene_layers:
+            num.save('%s.%s.npy' % (filename, layer), getattr(self, layer))
         self.save_config('%s.yml' % filename)
 
     def save_config(self, filename):
+        """ Save the scene configuration to a YAML (``.yml``) file.
+
+        Cached covariance matrices are written to binary
+        ``<filename>.covariance*.npy`` files next to the config.
+
+        :param filename: Filename of the config
+        :type filename: str
+        """
         _file, ext = path.splitext(filename)
         filename = _file if ext in ['yml'] else filename
         self._log.info('Saving scene config to %s' % filename)
+
+        cov_config = self.config.covariance
+        if self.__dict__.get('_cached_covariance', None) is not None\
+           or cov_config.covariance_matrix is not None\
+           or cov_config.covariance_matrix_file is not None\
+           or cov_config.covariance_cholesky_file is not None:
+            self.covariance._saveCachedMatrices(_file)
+        self._config_dir = path.dirname(path.abspath(filename))
+
         self.config.dump(filename='%s' % filename,
                          header='kite.Scene YAML Config')
 
     @dynamicmethod
     def _load(self, filename):
-        """ Load a kite scene from file ``filename.[npz,yml]``
+        """ Load a kite scene from file ``filename.[npy,yml]``
         structure.
 
+        The binary layers ``<filename>.<layer>.npy`` are memory-mapped
+        copy-on-write, data is paged in on demand and modifications are
+        not written back to disk. Legacy ``<filename>.npz`` containers
+        are read into memory.
+
         :param filename: Filenames the scene data is saved under
         :type filename: str
         :returns: Scene object from data resources
         :rtype: :class:`~kite.Scene`
         """
         scene = self
-        components = ['displacement', 'theta', 'phi']
 
-        basename = path.splitext(filename)[0]
-        scene._log.info('Loading from %s[.npz,.yml]' % basename)
+        basename = _containerBasename(filename)
+        scene._log.info('Loading from %s[.npy,.yml]' % basename)
         try:
-            data = num.load('%s.npz' % basename)
-            for i, comp in enumerate(components):
-                scene.__setattr__(comp, data['arr_%d' % i])
+            for layer, data in _loadContainerLayers(basename):
+                if data.ndim == 0:
+                    data = float(data)
+                elif layer == 'displacement':
+                    scene.config.dtype = data.dtype.name
+                scene.__setattr__(layer, data)
         except IOError:
-            raise UserIOWarning('Could not load data from %s.npz' % basename)
+            raise UserIOWarning('Could not load data from %s' % basename)
 
         try:
             scene.load_config('%s.yml' % basename)
@@ -592,6 +725,7 @@ class Scene(object):
 
     def load_config(self, filename):
         self._log.info('Loading config from %s' % filename)
+        self._config_dir = path.dirname(path.abspath(filename))
         self.config = guts.load(filename=filename)
         self.meta = self.config.meta
 
@@ -613,17 +747,11 @@ class Scene(object):
         import os
         if not os.path.isfile(path) or os.path.isdir(path):
             raise ImportError('File %s does not exist!' % path)
-        data = None
-
-        for mod in scene_io.__all__:
-            module = eval('scene_io.%s(scene)' % mod)
-            if module.validate(path, **kwargs):
-                scene._log.info('Importing %s using %s module' %
-                                (path, mod))
-                data = module.read(path, **kwargs)
-                break
-        if data is None:
-            raise ImportError('Could not recognize format for %s' % path)
+
+        module = scene_io.detectFormat(path, scene, **kwargs)
+        scene._log.info('Importing %s using %s module' %
+                        (path, module.__class__.__name__))
+        data = module.read(path, **kwargs)
 
         for sk in ['theta', 'phi', 'displacement']:
             setattr(scene, sk, data[sk])
@@ -642,9 +770,9 @@ class Scene(object):
     _import_data.__doc__ += \
         '\nSupported import modules are **%s**.\n'\
         % (', ').join(scene_io.__all__)
-    for mod in scene_io.__all__:
+    for mod in scene_io.formats:
         _import_data.__doc__ += '\n**%s**\n\n' % mod
-        _import_data.__doc__ += eval('scene_io.%s.__doc__' % mod)
+        _import_data.__doc__ += scene_io.formats[mod].__doc__
     import_data = staticmethod(_import_data)
 
     def __str__(self):
@@ -666,25 +794,26 @@ class LOSUnitVectors(object):
 
     @property_cached
     def unitE(self):
-        """ Unit vector east component, ``NxM`` matrix like
-            :attr:`~kite.Scene.displacement`
-        :type: :class:`numpy.ndarray`
+        """ Unit vector east component, broadcastable to
+            :attr:`~kite.Scene.displacement`. Constant look geometry yields
+            a float, see :meth:`~kite.Scene.expandLook`.
+        :type: float or :class:`numpy.ndarray`
         """
         return num.cos(self._scene.phi) * num.sin(self._scene.theta)
 
     @property_cached
     def unitN(self):
-        """ Unit vector north component, ``NxM`` matrix like
-            :attr:`~kite.Scene.displacement`
-        :type: :class:`numpy.ndarray`
+        """ Unit vector north component, broadcastable to
+            :attr:`~kite.Scene.displacement`.
+        :type: float or :class:`numpy.ndarray`
         """
         return num.sin(self._scene.phi) * num.sin(self._scene.theta)
 
     @property_cached
     def unitU(self):
-        """ Unit vector vertical (up) component, ``NxM`` matrix like
-            :attr:`~kite.Scene.displacement`
-        :type: :class:`numpy.ndarray`
+        """ Unit vector vertical (up) component, broadcastable to
+            :attr:`~kite.Scene.displacement`.
+        :type: float or :class:`numpy.ndarray`
         """
         return num.cos(self._scene.theta)
 
@@ -820,9 +949,8 @@ class SceneTest(Scene):
         scene.frame.dLon = 5e-4
         # scene.frame.E = num.arange(nE) * 50.
         # scene.frame.N = num.arange(nN) * 50.
-        scene.theta = num.repeat(
-            num.linspace(0.8, 0.85, nE), nN).reshape((nE, nN))
-        scene.phi = num.rot90(scene.theta)
+        scene.theta = num.linspace(0.8, 0.85, nE)[:, num.newaxis]
+        scene.phi = num.linspace(0.8, 0.85, nN)[num.newaxis, :]
         scene.displacement = num.zeros((nE, nN))
         return scene
 
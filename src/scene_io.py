@@ -1,7 +1,9 @@
 import os
+import copy
 import glob
 import scipy.io
 import numpy as num
+from collections import OrderedDict
 
 __all__ = ['Gamma', 'Matlab', 'ISCE', 'GMTSAR', 'ROI_PAC']
 
@@ -20,15 +22,82 @@ def safe_cast(val, to_type, default=None):
         return default
 
 
+def _fileStamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime, stat.st_size
+    except OSError:
+        return None
+
+
+def _readMagic(filename, nbytes=8):
+    try:
+        with open(filename, 'rb') as f:
+            return f.read(nbytes)
+    except IOError:
+        return ''
+
+
+# Least recently used discovery results, bounded to
+# discovery_cache_size entries
+_discovery_cache = OrderedDict()
+discovery_cache_size = 256
+
+
+def cached_discovery(func):
+    """ Cache results of a file discovery function
+
+    Discovery functions take a path as first argument (after ``self``)
+    and glob or parse files around it. Results, including raised
+    :class:`ImportError`, are cached until the path or its directory
+    changes, so :meth:`SceneIO.validate` and :meth:`SceneIO.read` share
+    a single discovery. The cache keeps the
+    :data:`discovery_cache_size` most recently used results, callers
+    receive shallow copies.
+    """
+    def wrapper(*args):
+        fargs = args[1:] if isinstance(args[0], SceneIO) else args
+        path = os.path.abspath(fargs[0])
+        dirname = path if os.path.isdir(path) else os.path.dirname(path)
+
+        key = (func, fargs, _fileStamp(path), _fileStamp(dirname))
+        try:
+            result, exception = _discovery_cache.pop(key)
+        except KeyError:
+            try:
+                result, exception = func(*args), None
+            except ImportError as e:
+                result, exception = None, e
+            while len(_discovery_cache) >= discovery_cache_size:
+                _discovery_cache.popitem(last=False)
+        _discovery_cache[key] = (result, exception)
+
+        if exception is not None:
+            raise exception
+        return copy.copy(result)
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
 class SceneIO(object):
     """ Prototype class for SARIO objects """
+    # Number of lines processed at once by chunked readers
+    chunk_lines = 1024
+    # Cheap signatures used by :func:`detectFormat`
+    extensions = ()
+    magic = ()
+
     def __init__(self, scene=None):
         if scene is not None:
             self._log = scene._log.getChild('IO/%s' % self.__class__.__name__)
+            self.dtype = scene.dtype
         else:
             import logging
             self._log = logging.getLogger('SceneIO/%s'
                                           % self.__class__.__name__)
+            self.dtype = num.dtype(num.float64)
 
         self.container = {
             'phi': 0.,    # Look orientation counter-clockwise angle from east
@@ -85,6 +154,26 @@ class SceneIO(object):
         pass
         raise NotImplementedError('validate not implemented')
 
+    @classmethod
+    def matchSignature(cls, filename):
+        """ Cheap format check on file extension and magic bytes
+
+        Does not list directories or parse files, a positive match is
+        confirmed by :meth:`validate`.
+
+        :param filename: file to check
+        :type filename: string
+        :returns: Whether the file carries the format's signature
+        :rtype: {bool}
+        """
+        if not cls.extensions and not cls.magic:
+            return False
+        if cls.extensions and not filename.endswith(cls.extensions):
+            return False
+        if cls.magic and not _readMagic(filename).startswith(cls.magic):
+            return False
+        return True
+
 
 class Matlab(SceneIO):
     """
@@ -103,6 +192,8 @@ class Matlab(SceneIO):
     Displacement is expected to be in meters.
 
     """
+    extensions = ('.mat',)
+
     def validate(self, filename, **kwargs):
         if filename[-4:] == '.mat':
             return True
@@ -193,9 +284,19 @@ class Gamma(SceneIO):
           'look_vector'
 
     """
+    @cached_discovery
     def _getParameterFile(self, path):
-        path = os.path.dirname(os.path.realpath(path))
-        par_files = glob.glob('%s/*par' % path)
+        path = os.path.realpath(path)
+        par_files = glob.glob('%s/*par' % os.path.dirname(path))
+        # Try parameter files named after the binary first
+        name = os.path.basename(path)
+        stem = name.split('.')[0]
+        exact = [name + '.par', name + '_par',
+                 os.path.splitext(name)[0] + '.par',
+                 os.path.splitext(name)[0] + '_par']
+        par_files.sort(
+            key=lambda f: (os.path.basename(f) not in exact,
+                           not os.path.basename(f).startswith(stem)))
 
         for file in par_files:
             try:
@@ -207,6 +308,7 @@ class Gamma(SceneIO):
         raise ImportError('Could not find suiting Gamma parameter file (*par)')
 
     @staticmethod
+    @cached_discovery
     def _parseParameterFile(par_file):
         import re
 
@@ -259,6 +361,32 @@ class Gamma(SceneIO):
         self._log.info('Found %s in %s' % (pattern, filename))
         return num.memmap(filename, mode='r', dtype='>f4')
 
+    def _readDisplacement(self, filename, nlines, nrows, scale):
+        ''' Read the binary displacement in a single pass over a memory map.
+
+        NaN-padding of an incomplete last line, masking of zeros and
+        scaling are applied line-chunk wise into one native array. '''
+        raw = num.memmap(filename, dtype='>f4', mode='r')
+        displ = num.empty((nlines, nrows), dtype=self.dtype)
+
+        for il in xrange(0, nlines, self.chunk_lines):
+            block = displ[il:il + self.chunk_lines].reshape(-1)
+            data = raw[il*nrows:il*nrows + block.size]
+
+            block[:data.size] = data
+            block[data.size:] = num.nan
+            block[block == 0.] = num.nan
+            if scale != 1.:
+                block *= scale
+        return displ
+
+    def _cosine(self, angle):
+        out = num.empty(angle.shape, dtype=self.dtype)
+        for il in xrange(0, angle.shape[0], self.chunk_lines):
+            num.cos(angle[il:il + self.chunk_lines],
+                    out=out[il:il + self.chunk_lines])
+        return out
+
     def read(self, filename, **kwargs):
         """
         :param filename: Gamma software parameter file
@@ -273,43 +401,35 @@ class Gamma(SceneIO):
         par_file = kwargs.pop('par_file',
                               self._getParameterFile(filename))
         par = self._parseParameterFile(par_file)
-        fill = None
+        c = self.container
 
         nrows = int(par['width'])
         nlines = int(par['nlines'])
         radar_frequency = par.get('radar_frequency', None)
+        utm_reference = par['DEM_projection'] == 'UTM'
 
-        displ = num.fromfile(filename, dtype='>f4')
-        # Resize array if last line is not scanned completely
-        if (displ.size % nrows) != 0:
-            fill = num.empty(nrows - displ.size % nrows)
-            fill.fill(num.nan)
-            displ = num.append(displ, fill)
+        scale = 1.
+        if radar_frequency is not None:
+            self._log.info('Scaling radian displacement by radar_frequency')
+            wavelength = 299792458. / radar_frequency
+            scale = wavelength / (4.*num.pi)
+            c['meta']['wavelength'] = wavelength
+        if utm_reference:
+            scale /= 100.
 
-        displ = displ.reshape(nlines, nrows)
-        displ[displ == -0.] = num.nan
-        displ = num.fliplr(displ)
+        # Flipping and transposing are expressed as views
+        displ = num.fliplr(
+            self._readDisplacement(filename, nlines, nrows, scale))
 
         phi = self._getAngle(filename, '*phi*')
         theta = self._getAngle(filename, '*theta*')
-        theta = num.cos(theta)
 
         if isinstance(phi, num.ndarray):
             phi = phi.reshape(nlines, nrows)
         if isinstance(theta, num.ndarray):
-            theta = theta.reshape(nlines, nrows)
-
-        if fill is not None:
-            theta = num.append(theta, fill)
-            phi = num.append(phi, fill)
-
-        c = self.container
-
-        if radar_frequency is not None:
-            self._log.info('Scaling radian displacement by radar_frequency')
-            wavelength = 299792458. / radar_frequency
-            displ = (displ / (4.*num.pi)) * wavelength
-            c['meta']['wavelength'] = wavelength
+            theta = self._cosine(theta.reshape(nlines, nrows))
+        else:
+            theta = float(num.cos(theta))
 
         c['displacement'] = displ
         c['theta'] = theta
@@ -319,10 +439,10 @@ class Gamma(SceneIO):
         c['bin_file'] = filename
         c['par_file'] = par_file
 
-        if par['DEM_projection'] == 'UTM':
+        if utm_reference:
             self._log.info('Parameter file provides UTM reference')
             import utm
-            c['displacement'] = num.transpose(displ/100)
+            c['displacement'] = displ.T
             c['theta'] = num.transpose(theta)
             c['phi'] = num.transpose(phi)
             utm_zone = par['projection_zone']
@@ -380,6 +500,10 @@ class ROI_PAC(SceneIO):
           'Y_STEP', 'WAVELENGTH``
     """
 
+    @classmethod
+    def matchSignature(cls, filename):
+        return os.path.isfile(os.path.realpath(filename) + '.rsc')
+
     def validate(self, filename, **kwargs):
         try:
             par_file = kwargs.pop('par_file',
@@ -393,13 +517,14 @@ class ROI_PAC(SceneIO):
         par_file = os.path.realpath(bin_file) + '.rsc'
         try:
             self._parseParameterFile(par_file)
-            self._log.debug('Found parameter file %s' % file)
+            self._log.debug('Found parameter file %s' % par_file)
             return par_file
         except (ImportError, IOError):
             raise ImportError('Could not find ROI_PAC parameter file (%s)'
                               % par_file)
 
     @staticmethod
+    @cached_discovery
     def _parseParameterFile(par_file):
         import re
 
@@ -518,6 +643,8 @@ class ISCE(SceneIO):
         meters yet, as 'wavelength' or at least sensor name is not
         provided in the XML file.
     """
+    extensions = ('.unw.geo',)
+
     def validate(self, filename, **kwargs):
         try:
             self._getDisplacementFile(filename)
@@ -527,6 +654,7 @@ class ISCE(SceneIO):
             return False
 
     @staticmethod
+    @cached_discovery
     def _getLOSFile(path):
         if not os.path.isdir(path):
             path = os.path.dirname(path)
@@ -537,6 +665,7 @@ class ISCE(SceneIO):
         return rdr_files[0]
 
     @staticmethod
+    @cached_discovery
     def _getDisplacementFile(path):
         if os.path.isfile(path):
             disp_file = path
@@ -599,6 +728,9 @@ class GMTSAR(SceneIO):
         * LOS binary data (see instruction, :file:`*los.enu`)
 
     """
+    extensions = ('.grd',)
+    magic = ('CDF\x01', 'CDF\x02')  # NetCDF classic and 64-bit offset
+
     def validate(self, filename, **kwargs):
         try:
             if self._getDisplacementFile(filename)[-4:] == '.grd':
@@ -607,6 +739,7 @@ class GMTSAR(SceneIO):
             return False
         return False
 
+    @cached_discovery
     def _getLOSFile(self, path):
         if not os.path.isdir(path):
             path = os.path.dirname(path)
@@ -628,6 +761,31 @@ class GMTSAR(SceneIO):
             disp_file = files[0]
         return disp_file
 
+    # Interleaved SAT_look records: lon, lat, elevation and the
+    # east, north and up components of the look vector
+    los_dtype = num.dtype([('lon', '<f4'), ('lat', '<f4'),
+                           ('elevation', '<f4'),
+                           ('e', '<f4'), ('n', '<f4'), ('u', '<f4')])
+
+    def _readLOS(self, filename, shape):
+        ''' Angles from the memory-mapped LOS records, computed in one
+        line-chunked pass into preallocated outputs. '''
+        los = num.memmap(filename, dtype=self.los_dtype, mode='r')\
+            .reshape(shape)
+        theta = num.empty(shape, dtype=self.dtype)
+        phi = num.empty(shape, dtype=self.dtype)
+
+        for il in xrange(0, shape[0], self.chunk_lines):
+            lines = slice(il, il + self.chunk_lines)
+            rec = los[lines]
+            e, n, u = rec['e'], rec['n'], rec['u']
+
+            th = theta[lines]
+            num.rad2deg(num.arctan(n / e), out=th)
+            th[n < 0] += 180.
+            num.rad2deg(num.arccos(u), out=phi[lines])
+        return theta, phi
+
     def read(self, path, **kwargs):
         from scipy.io import netcdf
         path = os.path.abspath(path)
@@ -635,8 +793,9 @@ class GMTSAR(SceneIO):
 
         grd = netcdf.netcdf_file(self._getDisplacementFile(path),
                                  mode='r', version=2)
-        displ = grd.variables['z'][:].copy()
-        displ /= 1e2  # los_ll.grd files come in cm
+        z = grd.variables['z'][:]
+        displ = num.empty(z.shape, dtype=self.dtype)
+        num.divide(z, 1e2, out=displ)  # los_ll.grd files come in cm
         c['displacement'] = displ
         shape = c['displacement'].shape
         # LatLon
@@ -650,15 +809,7 @@ class GMTSAR(SceneIO):
 
         # Theta and Phi
         try:
-            los = num.memmap(self._getLOSFile(path), dtype='<f4')
-            e = los[3::6].copy().reshape(shape)
-            n = los[4::6].copy().reshape(shape)
-            u = los[5::6].copy().reshape(shape)
-
-            theta = num.rad2deg(num.arctan(n/e))
-            phi = num.rad2deg(num.arccos(u))
-            theta[n < 0] += 180.
-
+            theta, phi = self._readLOS(self._getLOSFile(path), shape)
             c['phi'] = phi
             c['theta'] = theta
         except ImportError:
@@ -668,3 +819,32 @@ class GMTSAR(SceneIO):
             c['phi'] = 0.
 
         return c
+
+
+formats = OrderedDict((name, globals()[name]) for name in __all__)
+
+
+def detectFormat(filename, scene=None, **kwargs):
+    """ Find the import module for ``filename``
+
+    Modules whose :meth:`SceneIO.matchSignature` matches are validated
+    first, the remaining modules of :data:`formats` are tried in order
+    afterwards.
+
+    :param filename: file to import
+    :type filename: str
+    :param scene: Scene the module is logging to
+    :type scene: :class:`~kite.Scene`
+    :param kwargs: keyword arguments passed to :meth:`SceneIO.validate`
+    :type kwargs: dict
+    :returns: Validated import module
+    :rtype: :class:`SceneIO`
+    :raises: ImportError
+    """
+    candidates = sorted(formats.itervalues(),
+                        key=lambda io: not io.matchSignature(filename))
+    for io in candidates:
+        module = io(scene)
+        if module.validate(filename, **kwargs):
+            return module
+    raise ImportError('Could not recognize format for %s' % filename)
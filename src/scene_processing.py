@@ -1,17 +1,16 @@
 #!/bin/python
 import numpy as num
 
-from scipy import ndimage
-
-from pyrocko.guts import Object, Float, Int
-from .meta import Subject, ADict
+from pyrocko.guts import Object, Float, Int, StringChoice
+from .meta import Subject, blockReduce
+from .tiled import TiledArray
 
 
 class SceneProcess(Object):
     def __init__(self, scene, *args, **kwargs):
-        Object.__init__(self, *args, **kwargs)
         self.scene = scene
         self.evProcessChanged = Subject()
+        Object.__init__(self, *args, **kwargs)
 
     def __setattr__(self, attr, value):
         if attr in self.T.propnames:
@@ -41,48 +40,56 @@ class StaticOffset(SceneProcess):
 
 
 class Downsample(SceneProcess):
-    from scipy import ndimage
-
+    """ Downsample the scene by NaN-aware reduction of pixel blocks, see
+    :func:`kite.meta.blockReduce`. Blocks at the trailing edges are
+    reduced over the available pixels. Look angles which are constant
+    along an axis keep their shape.
+
+    The original layers are kept by reference, :meth:`apply` assigns new
+    arrays and does not modify them.
+    """
     factor = Int.T(
         help='Downsample factor.')
+    statistic = StringChoice.T(
+        choices=['mean', 'median'],
+        default='mean',
+        help='Statistic of the pixel blocks.')
+
+    # Number of input rows reduced at once
+    chunk_lines = 256
 
     def __init__(self, *args, **kwargs):
         SceneProcess.__init__(self, *args, **kwargs)
         sc = self.scene
-        self.original = ADict()
-        self.original.update({
-            'displacement': sc.displacement.copy(),
-            'theta': sc.theta.copy(),
-            'phi': sc.phi.copy(),
-            'frame.dLat': sc.frame.dLat,
-            'frame.dLon': sc.frame.dLon,
-        })
+        self.original = {
+            'displacement': sc.displacement,
+            'theta': sc.theta,
+            'phi': sc.phi,
+            'dLat': sc.frame.dLat,
+            'dLon': sc.frame.dLon,
+        }
 
     def apply(self):
         sc = self.scene
         org = self.original
-        factor = self.factor
-
-        sx, sy = sc.displacement.shape
-        gx, gy = num.ogrid[0:sx, 0:sy]
-        regions = sy/factor * (gx/factor) + gy/factor
-        indices = num.arange(regions.max() + 1)
-
-        def block_downsample(arr):
-            res = ndimage.mean(
-                arr,
-                labels=regions,
-                index=indices)
-            res.shape = (sx/factor, sy/factor)
-            return res
-
-        sc.displacement = block_downsample(sc.displacement)
-        sc.theta = block_downsample(sc.theta)
-        sc.phi = block_downsample(sc.phi)
-        sc.frame.dLat = org['frame.dLat'] * self.factor
-        sc.frame.dLon = org['frame.dLat'] * self.factor
+
+        def reduce(arr):
+            if not isinstance(arr, (num.ndarray, TiledArray)):
+                return arr
+            return blockReduce(arr, self.factor, self.statistic,
+                               chunk_lines=self.chunk_lines)
+
+        sc.displacement = reduce(org['displacement'])
+        sc.theta = reduce(org['theta'])
+        sc.phi = reduce(org['phi'])
+        sc.frame.dLat = org['dLat'] * self.factor
+        sc.frame.dLon = org['dLon'] * self.factor
 
     def remove(self):
-        for prop, value in self.original.iteritems():
-            self.scene.__setattr__(prop, value)
+        sc = self.scene
+        org = self.original
+        for layer in ('displacement', 'theta', 'phi'):
+            setattr(sc, layer, org[layer])
+        sc.frame.dLat = org['dLat']
+        sc.frame.dLon = org['dLon']
         del self.original
@@ -25,7 +25,7 @@ def main(args=None):
         conflict_handler='resolve',
         add_help=True)
     parser.add_argument('file', type=str,
-                        help='Load Kite native container (*.npz/*.yml)',
+                        help='Load Kite native container (*.yml/*.npy/*.npz)',
                         default=None, nargs='?')
     parser.add_argument('--load', metavar='file', type=str,
                         default=None,
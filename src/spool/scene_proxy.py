@@ -107,7 +107,8 @@ class QSceneProxy(QtCore.QObject):
         self.sigProcessingStarted.emit(
             'Calculating <span style="font-family: monospace">'
             'Covariance.weight_matrix</span>, this can take a few minutes...')
-        self.scene.covariance.export_weight_matrix(filename)
+        fmt = 'npy' if filename.endswith('.npy') else 'txt'
+        self.scene.covariance.export_weight_matrix(filename, format=fmt)
         self.sigProcessingFinished.emit()
 
     @QtCore.Slot()
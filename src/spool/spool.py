@@ -188,7 +188,8 @@ class SpoolMainWindow(QtGui.QMainWindow):
 
     def onSaveData(self):
         filename, _ = QtGui.QFileDialog.getSaveFileName(
-            filter='YAML *.yml and NumPy container *.npz (*.yml *.npz)',
+            filter='YAML *.yml and NumPy container *.npy/*.npz '
+                   '(*.yml *.npy *.npz)',
             caption='Save scene')
         if not validateFilename(filename):
             return
@@ -203,7 +204,8 @@ class SpoolMainWindow(QtGui.QMainWindow):
 
     def onOpenScene(self):
         filename, _ = QtGui.QFileDialog.getOpenFileName(
-            filter='YAML *.yml and NumPy container *.npz (*.yml *.npz)',
+            filter='YAML *.yml and NumPy container *.npy/*.npz '
+                   '(*.yml *.npy *.npz)',
             caption='Load kite scene')
         if not validateFilename(filename):
             return
@@ -231,7 +233,7 @@ class SpoolMainWindow(QtGui.QMainWindow):
 
     def onExportWeightMatrix(self):
         filename, _ = QtGui.QFileDialog.getSaveFileName(
-            filter='Text File *.txt (*.txt)',
+            filter='Text File *.txt (*.txt);;NumPy File *.npy (*.npy)',
             caption='Export Covariance Weights',)
         if not validateFilename(filename):
             return
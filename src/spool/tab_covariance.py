@@ -92,7 +92,10 @@ class QKiteNoisePlot(QKitePlot):
                               sideScalers=True,
                               pen=pen_roi)
         self.roi.setAcceptedMouseButtons(QtCore.Qt.RightButton)
-        self.roi.sigRegionChangeFinished.connect(self.updateNoiseRegion)
+        # Update spectrum and covariance while the noise patch is dragged
+        self._roi_proxy = pg.SignalProxy(self.roi.sigRegionChanged,
+                                         rateLimit=10,
+                                         slot=self.updateNoiseRegion)
         self.addItem(self.roi)
 
         self.scene_proxy.sigCovarianceConfigChanged.connect(
@@ -100,12 +103,14 @@ class QKiteNoisePlot(QKitePlot):
 
     def onConfigChanged(self):
         llE, llN, sizeE, sizeN = self.scene_proxy.covariance.noise_coord
+        self._roi_proxy.block = True
         self.roi.setPos((llE, llN), update=False, finish=False)
         self.roi.setSize((sizeE, sizeN), finish=False)
+        self._roi_proxy.block = False
         self.update()
         self.transFromFrame()
 
-    def updateNoiseRegion(self):
+    def updateNoiseRegion(self, *args):
         data = self.roi.getArrayRegion(self.image.image, self.image)
         data[data == 0.] = num.nan
         if num.all(num.isnan(data)):
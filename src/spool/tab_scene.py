@@ -59,19 +59,26 @@ class QKiteScenePlot(QKitePlot):
             'displacement':
                 ['Scene.displacement', lambda sp: sp.scene.displacement],
             'theta':
-                ['Scene.theta', lambda sp: sp.scene.theta],
+                ['Scene.theta',
+                 lambda sp: sp.scene.expandLook(sp.scene.theta)],
             'phi':
-                ['Scene.phi', lambda sp: sp.scene.phi],
+                ['Scene.phi',
+                 lambda sp: sp.scene.expandLook(sp.scene.phi)],
             'degTheta':
-                ['Scene.thetaDeg', lambda sp: sp.scene.thetaDeg],
+                ['Scene.thetaDeg',
+                 lambda sp: sp.scene.expandLook(sp.scene.thetaDeg)],
             'degPhi':
-                ['Scene.phiDeg', lambda sp: sp.scene.phiDeg],
+                ['Scene.phiDeg',
+                 lambda sp: sp.scene.expandLook(sp.scene.phiDeg)],
             'unitE':
-                ['Scene.los.unitE', lambda sp: sp.scene.los.unitE],
+                ['Scene.los.unitE',
+                 lambda sp: sp.scene.expandLook(sp.scene.los.unitE)],
             'unitN':
-                ['Scene.los.unitN', lambda sp: sp.scene.los.unitN],
+                ['Scene.los.unitN',
+                 lambda sp: sp.scene.expandLook(sp.scene.los.unitN)],
             'unitU':
-                ['Scene.los.unitU', lambda sp: sp.scene.los.unitU],
+                ['Scene.los.unitU',
+                 lambda sp: sp.scene.expandLook(sp.scene.los.unitU)],
         }
         self._component = 'displacement'
 
@@ -0,0 +1,390 @@
+#!/bin/python
+import os
+import zlib
+import logging
+import numpy as num
+
+from collections import OrderedDict
+from os import path
+from pyrocko import guts
+from .meta import blockReduce
+
+__all__ = ['TiledArray', 'TiledArrayConfig']
+
+codecs = {
+    'none': (lambda buf: buf, lambda buf: buf),
+    'zlib': (lambda buf: zlib.compress(buf, 1), zlib.decompress),
+}
+
+try:
+    import lz4.block
+    codecs['lz4'] = (lz4.block.compress, lz4.block.decompress)
+except ImportError:
+    pass
+
+_config_file = 'tiled.yml'
+
+
+class TiledArrayConfig(guts.Object):
+    """ Layout of a :class:`~kite.tiled.TiledArray` on disk """
+    shape = guts.Tuple.T(
+        2, guts.Int.T(),
+        help='Shape of the array, (rows, columns)')
+    tile_shape = guts.Tuple.T(
+        2, guts.Int.T(),
+        default=(512, 512),
+        help='Shape of a single tile, (rows, columns)')
+    dtype = guts.String.T(
+        default='<f8',
+        help='NumPy dtype string of the array')
+    codec = guts.StringChoice.T(
+        choices=['none', 'zlib', 'lz4'],
+        default='zlib',
+        help='Compression codec of the tiles')
+    fill_value = guts.Float.T(
+        default=num.nan,
+        help='Value of tiles which were never written')
+
+
+class _DirectoryStore(object):
+    """ Tile store backed by one file per tile in a directory """
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def _filename(self, key):
+        return path.join(self.dirname, '%d_%d.tile' % key)
+
+    def __contains__(self, key):
+        return path.isfile(self._filename(key))
+
+    def __getitem__(self, key):
+        with open(self._filename(key), 'rb') as f:
+            return f.read()
+
+    def __setitem__(self, key, buf):
+        with open(self._filename(key), 'wb') as f:
+            f.write(buf)
+
+
+class TiledArray(object):
+    """ 2D array stored as fixed-size, compressed tiles for out-of-core
+        processing.
+
+    Tiles are decompressed on access and held in a least recently used
+    cache limited to ``cache_size`` bytes; modified tiles are compressed
+    and written back when they are evicted or on :meth:`flush`. Tiles
+    which were never written read as
+    :attr:`~kite.tiled.TiledArrayConfig.fill_value`, sparse mosaics
+    therefore only store their covered tiles.
+
+    Basic slicing ``array[rows, cols]`` returns a :class:`numpy.ndarray`
+    and only touches the intersecting tiles.
+
+    :param config: Layout of the array
+    :type config: :class:`~kite.tiled.TiledArrayConfig`
+    :param filename: Directory holding the tiles, ``None`` keeps the
+        compressed tiles in memory.
+    :type filename: str, optional
+    :param cache_size: Size of the decompressed tile cache in bytes
+    :type cache_size: float, optional
+    """
+    def __init__(self, config, filename=None, cache_size=256e6):
+        if config.codec not in codecs:
+            raise ImportError('Codec %s is not available' % config.codec)
+        self.config = config
+        self.filename = filename
+        self.cache_size = cache_size
+        self._log = logging.getLogger('TiledArray')
+
+        self._compress, self._decompress = codecs[config.codec]
+        if filename is None:
+            self._store = {}
+        else:
+            self._store = _DirectoryStore(filename)
+
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
+        self._dirty = set()
+
+    @classmethod
+    def create(cls, filename, shape, dtype=num.float64, tile_shape=(512, 512),
+               codec='zlib', fill_value=num.nan, cache_size=256e6):
+        """ Create an empty tiled array.
+
+        :param filename: Directory to store the tiles in, ``None`` keeps
+            them in memory.
+        :type filename: str
+        :param shape: Shape of the array
+        :type shape: tuple
+        :param dtype: Data type
+        :type dtype: :class:`numpy.dtype`, optional
+        :param tile_shape: Shape of a tile
+        :type tile_shape: tuple, optional
+        :param codec: Compression codec, ``none``, ``zlib`` or ``lz4``
+        :type codec: str, optional
+        :param fill_value: Value of unwritten pixels
+        :type fill_value: float, optional
+        :rtype: :class:`~kite.tiled.TiledArray`
+        """
+        config = TiledArrayConfig(
+            shape=tuple(int(s) for s in shape),
+            tile_shape=tuple(int(s) for s in tile_shape),
+            dtype=num.dtype(dtype).str,
+            codec=codec,
+            fill_value=float(fill_value))
+
+        if filename is not None:
+            if not path.isdir(filename):
+                os.makedirs(filename)
+            config.dump(filename=path.join(filename, _config_file),
+                        header='kite.TiledArray YAML Config')
+        return cls(config, filename, cache_size)
+
+    @classmethod
+    def open(cls, filename, cache_size=256e6):
+        """ Open a tiled array from directory ``filename``.
+
+        :rtype: :class:`~kite.tiled.TiledArray`
+        """
+        config = guts.load(filename=path.join(filename, _config_file))
+        return cls(config, filename, cache_size)
+
+    @classmethod
+    def fromArray(cls, array, filename=None, **kwargs):
+        """ Create a tiled array from a 2D array, see :meth:`create`.
+
+        :param array: 2D array, can be a :class:`numpy.memmap`
+        :type array: :class:`numpy.ndarray`
+        :rtype: :class:`~kite.tiled.TiledArray`
+        """
+        kwargs.setdefault('dtype', array.dtype)
+        tiled = cls.create(filename, array.shape, **kwargs)
+        nr, nc = tiled.tile_shape
+        for r in xrange(0, tiled.shape[0], nr):
+            for c in xrange(0, tiled.shape[1], nc):
+                tiled[r:r+nr, c:c+nc] = array[r:r+nr, c:c+nc]
+        tiled.flush()
+        return tiled
+
+    @property
+    def shape(self):
+        return self.config.shape
+
+    @property
+    def tile_shape(self):
+        return self.config.tile_shape
+
+    @property
+    def dtype(self):
+        return num.dtype(self.config.dtype)
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    @property
+    def ntiles(self):
+        """ Number of tiles along rows and columns
+
+        :type: tuple
+        """
+        return tuple(-(-s // t) for s, t in zip(self.shape, self.tile_shape))
+
+    def _tileSlices(self, key):
+        tr, tc = key
+        nr, nc = self.tile_shape
+        return (slice(tr*nr, min((tr+1)*nr, self.shape[0])),
+                slice(tc*nc, min((tc+1)*nc, self.shape[1])))
+
+    def _getTile(self, key):
+        tile = self._cache.pop(key, None)
+        if tile is None:
+            rows, cols = self._tileSlices(key)
+            shape = (rows.stop - rows.start, cols.stop - cols.start)
+            if key in self._store:
+                tile = num.frombuffer(
+                    self._decompress(self._store[key]),
+                    dtype=self.dtype).reshape(shape).copy()
+            else:
+                tile = num.full(shape, self.config.fill_value,
+                                dtype=self.dtype)
+            self._cache_nbytes += tile.nbytes
+        self._cache[key] = tile
+        self._evict()
+        return tile
+
+    def _evict(self):
+        while self._cache_nbytes > self.cache_size and len(self._cache) > 1:
+            key, tile = self._cache.popitem(last=False)
+            self._cache_nbytes -= tile.nbytes
+            if key in self._dirty:
+                self._writeTile(key, tile)
+
+    def _writeTile(self, key, tile):
+        self._store[key] = self._compress(
+            num.ascontiguousarray(tile).tobytes())
+        self._dirty.discard(key)
+
+    def flush(self):
+        """ Write all modified tiles to the store """
+        for key in list(self._dirty):
+            self._writeTile(key, self._cache[key])
+
+    def _normalizeKey(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('TiledArray is 2-dimensional')
+
+        slices = []
+        squeeze = []
+        for ax, k in enumerate(key):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(self.shape[ax])
+                if step != 1:
+                    raise IndexError('TiledArray supports only slices'
+                                     ' with step 1')
+                slices.append(slice(start, max(start, stop)))
+            else:
+                k = int(k)
+                if k < 0:
+                    k += self.shape[ax]
+                if not 0 <= k < self.shape[ax]:
+                    raise IndexError('Index %d is out of bounds' % k)
+                slices.append(slice(k, k+1))
+                squeeze.append(ax)
+        return slices, tuple(squeeze)
+
+    def _iterIntersecting(self, rows, cols):
+        nr, nc = self.tile_shape
+        for tr in xrange(rows.start // nr, -(-rows.stop // nr)):
+            for tc in xrange(cols.start // nc, -(-cols.stop // nc)):
+                trows, tcols = self._tileSlices((tr, tc))
+                r0, r1 = max(rows.start, trows.start), min(rows.stop,
+                                                           trows.stop)
+                c0, c1 = max(cols.start, tcols.start), min(cols.stop,
+                                                           tcols.stop)
+                yield ((tr, tc),
+                       (slice(r0 - rows.start, r1 - rows.start),
+                        slice(c0 - cols.start, c1 - cols.start)),
+                       (slice(r0 - trows.start, r1 - trows.start),
+                        slice(c0 - tcols.start, c1 - tcols.start)))
+
+    def __getitem__(self, key):
+        (rows, cols), squeeze = self._normalizeKey(key)
+        out = num.empty((rows.stop - rows.start, cols.stop - cols.start),
+                        dtype=self.dtype)
+        for tkey, out_slc, tile_slc in self._iterIntersecting(rows, cols):
+            out[out_slc] = self._getTile(tkey)[tile_slc]
+        if squeeze:
+            out = out.squeeze(axis=squeeze)
+        return out
+
+    def __setitem__(self, key, value):
+        (rows, cols), _ = self._normalizeKey(key)
+        value = num.broadcast_to(
+            num.asarray(value, dtype=self.dtype),
+            (rows.stop - rows.start, cols.stop - cols.start))
+        for tkey, val_slc, tile_slc in self._iterIntersecting(rows, cols):
+            self._getTile(tkey)[tile_slc] = value[val_slc]
+            self._dirty.add(tkey)
+
+    def __array__(self, dtype=None):
+        arr = self[:, :]
+        if dtype is not None:
+            arr = arr.astype(dtype)
+        return arr
+
+    def iterTiles(self):
+        """ Iterate over all tiles in row-major order.
+
+        :returns: Generator of ``(rows, cols, data)``, the tile's slices
+            into the array and its data
+        :rtype: generator
+        """
+        for tr in xrange(self.ntiles[0]):
+            for tc in xrange(self.ntiles[1]):
+                rows, cols = self._tileSlices((tr, tc))
+                yield rows, cols, self._getTile((tr, tc))
+
+    def iterBands(self, nrows):
+        """ Iterate over full-width row bands of the array.
+
+        :param nrows: Height of a band, the last band may be smaller
+        :type nrows: int
+        :returns: Generator of ``(rows, data)``
+        :rtype: generator
+        """
+        for r in xrange(0, self.shape[0], nrows):
+            rows = slice(r, min(r + nrows, self.shape[0]))
+            yield rows, self[rows, :]
+
+    def map(self, func, dtype=None, filename=None, **kwargs):
+        """ Apply the element-wise ``func`` tile by tile.
+
+        :param func: Function applied to each tile, must preserve shape
+        :type func: callable
+        :param dtype: Data type of the result, defaults to own dtype
+        :type dtype: :class:`numpy.dtype`, optional
+        :param filename: Directory of the result, ``None`` keeps it in
+            memory
+        :type filename: str, optional
+        :rtype: :class:`~kite.tiled.TiledArray`
+        """
+        kwargs.setdefault('tile_shape', self.tile_shape)
+        kwargs.setdefault('codec', self.config.codec)
+        kwargs.setdefault('fill_value', 0.)
+        res = self.create(filename, self.shape, dtype=dtype or self.dtype,
+                          **kwargs)
+        for rows, cols, data in self.iterTiles():
+            res[rows, cols] = func(data)
+        res.flush()
+        return res
+
+    def nanstats(self):
+        """ Streamed count, mean and standard deviation of all non-NaN
+            values.
+
+        :rtype: tuple, (int, float, float)
+        """
+        count, mean, m2 = 0, 0., 0.
+        for _, _, data in self.iterTiles():
+            valid = data[~num.isnan(data)]
+            n = valid.size
+            if n == 0:
+                continue
+            tmean = valid.mean(dtype=num.float64)
+            tm2 = num.sum((valid - tmean)**2, dtype=num.float64)
+            delta = tmean - mean
+            total = count + n
+            mean += delta * n / total
+            m2 += tm2 + delta**2 * count * n / total
+            count = total
+
+        if count == 0:
+            return 0, num.nan, num.nan
+        return count, mean, num.sqrt(m2 / count)
+
+    def downsample(self, factor, statistic='mean'):
+        """ Streamed block reduction over ``factor x factor`` pixels
+            ignoring NaN values, see :func:`kite.meta.blockReduce`.
+            Trailing rows and columns which do not fill a block are
+            dropped.
+
+        :param factor: Downsampling factor
+        :type factor: int
+        :param statistic: Block statistic, ``mean`` or ``median``
+        :type statistic: str
+        :rtype: :class:`numpy.ndarray`
+        """
+        band = max(1, self.tile_shape[0] // factor) * factor
+        return blockReduce(self, factor, statistic=statistic,
+                           chunk_lines=band, trim=True)
@@ -0,0 +1,119 @@
+#!/bin/python
+import unittest
+import os
+import signal
+import shutil
+import tempfile
+import numpy as num
+from kite import Scene, batch
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='kite')
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        self.files = []
+        for iscene in xrange(3):
+            dirname = os.path.join(self.tmp_dir, 'roipac', 'track%d' % iscene)
+            os.makedirs(dirname)
+            self.files.append(self._writeROI_PAC(
+                os.path.join(dirname, 'scene%d.unw' % iscene),
+                nlines=40, nrows=50))
+
+    @staticmethod
+    def _writeROI_PAC(filename, nlines, nrows):
+        data = num.random.rand(nlines, nrows*2).astype('<f4')
+        data.tofile(filename)
+        with open(filename + '.rsc', 'w') as rsc:
+            for k, v in (('WIDTH', nrows), ('FILE_LENGTH', nlines),
+                         ('X_FIRST', 96.), ('Y_FIRST', 22.),
+                         ('X_STEP', .001), ('Y_STEP', .001),
+                         ('WAVELENGTH', .056)):
+                rsc.write('%s %s\n' % (k, v))
+        return filename
+
+    def testFindScenes(self):
+        scenes = list(batch.findScenes(self.tmp_dir))
+        self.assertEqual([f for f, _ in scenes], self.files)
+        self.assertEqual(set(fmt for _, fmt in scenes), set(['ROI_PAC']))
+
+        self.assertEqual(
+            batch.containerName(self.files[0], self.tmp_dir, '/out'),
+            '/out/roipac/track0/scene0')
+
+    def testFindGammaScenes(self):
+        dirname = os.path.join(self.tmp_dir, 'gamma')
+        os.makedirs(dirname)
+        nlines, width = 40, 50
+
+        def writePar(filename):
+            with open(filename, 'w') as par:
+                for k, v in (('corner_lat', 22.), ('corner_lon', 96.),
+                             ('post_lat', -.001), ('post_lon', .001),
+                             ('nlines', nlines), ('width', width)):
+                    par.write('%s:  %s  decimal degrees\n' % (k, v))
+
+        displ = os.path.join(dirname, '20110214_20110401.disp')
+        writePar(displ + '.par')
+        for fn in ('20110214_20110401.disp', '20110214_20110401.cc',
+                   '20110214_20110401.mli', '20110214_20110401.png',
+                   'quicklook'):
+            num.zeros((nlines, width), dtype='>f4').tofile(
+                os.path.join(dirname, fn))
+        for fn in ('dem_par', 'off_par'):
+            writePar(os.path.join(dirname, fn))
+
+        self.assertEqual(list(batch.findScenes(dirname)),
+                         [(displ, 'Gamma')])
+
+    def testConvertScenes(self):
+        outdir = os.path.join(self.tmp_dir, 'kite')
+        jobs = [(f, batch.containerName(f, self.tmp_dir, outdir))
+                for f in self.files]
+
+        # The budget only allows a single conversion at a time
+        memory = batch.estimateMemory(self.files[0])
+        results = list(batch.convertScenes(
+            jobs, nworkers=2, memory_budget=memory, quadtree=True))
+
+        self.assertEqual(sorted(r[:2] for r in results), sorted(jobs))
+        for filename, container, error in results:
+            self.assertIsNone(error)
+            self.assertTrue(os.path.isfile('%s.quadtree.csv' % container))
+
+            sc = Scene.load(container)
+            data = num.fromfile(filename, dtype='<f4').reshape(40, 100)
+            num.testing.assert_allclose(
+                sc.displacement, data[:, 50:] / (4.*num.pi) * .056,
+                rtol=1e-6)
+
+        _, _, error = batch.convertScene(self.files[0] + '.rsc', 'none')
+        self.assertIsNotNone(error)
+
+    def testWorkerDied(self):
+        convertScene = batch.convertScene
+        self.addCleanup(setattr, batch, 'convertScene', convertScene)
+        self.addCleanup(setattr, batch, 'worker_grace', batch.worker_grace)
+
+        def dieOnFirst(filename, container, **kwargs):
+            if filename == self.files[0]:
+                os.kill(os.getpid(), signal.SIGKILL)
+            return convertScene(filename, container, **kwargs)
+
+        # Workers are forked and pick up the patched function
+        batch.convertScene = dieOnFirst
+        batch.worker_grace = .5
+
+        jobs = [(f, os.path.splitext(f)[0]) for f in self.files]
+        errors = dict((f, e) for f, _, e in batch.convertScenes(
+            jobs, nworkers=2, poll_interval=.1))
+
+        self.assertEqual(sorted(errors), sorted(self.files))
+        self.assertIn('died', errors[self.files[0]])
+        self.assertIsNone(errors[self.files[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
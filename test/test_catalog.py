@@ -0,0 +1,88 @@
+#!/bin/python
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as num
+from kite import Scene
+from kite.scene import SceneConfig
+from kite.catalog import SceneCatalog
+
+day = 24. * 3600.
+
+
+class TestSceneCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='kite')
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+        self.catalog = SceneCatalog(os.path.join(self.tmp_dir, 'catalog.db'))
+        self.addCleanup(self.catalog.close)
+
+        for iscene in xrange(4):
+            sc = self._scene(iscene)
+            dirname = os.path.join(self.tmp_dir, 'track%d' % (iscene % 2))
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            sc.save(os.path.join(dirname, 'scene%d' % iscene))
+
+    @staticmethod
+    def _scene(iscene, rows=30, cols=40):
+        sc = Scene(config=SceneConfig())
+        sc.setLogLevel('ERROR')
+        sc.meta.scene_id = 'scene%d' % iscene
+        sc.meta.satellite_name = 'Sentinel-1'
+        sc.meta.orbit_direction = ('Ascending', 'Descending')[iscene % 2]
+        sc.meta.time_master = 1.45e9 + iscene * 12. * day
+        sc.meta.time_slave = sc.meta.time_master + 24. * day
+        sc.frame.llLat = 20. + iscene
+        sc.frame.llLon = 95.
+        sc.frame.dLat = sc.frame.dLon = .01
+        sc.displacement = num.zeros((rows, cols))
+        sc.theta = num.zeros((rows, 1))
+        sc.phi = .5
+        return sc
+
+    def testUpdate(self):
+        self.assertEqual(self.catalog.update(self.tmp_dir), (4, 0))
+        self.assertEqual(len(self.catalog), 4)
+        self.assertEqual(self.catalog.update(self.tmp_dir), (0, 0))
+
+        sc = self._scene(1, rows=50)
+        sc.save(os.path.join(self.tmp_dir, 'track1', 'scene1'))
+        os.remove(os.path.join(self.tmp_dir, 'track0', 'scene2.yml'))
+        self.assertEqual(self.catalog.update(self.tmp_dir), (1, 1))
+
+        entry, = self.catalog.query(tmax=1.45e9 + 13. * day,
+                                    tmin=1.45e9 + 25. * day)
+        self.assertEqual(entry.scene_id, 'scene1')
+        self.assertEqual(entry.rows, 50)
+        self.assertEqual(entry.shapes, {'displacement': (50, 40),
+                                        'theta': (50, 1),
+                                        'phi': ()})
+
+    def testQuery(self):
+        self.catalog.update(self.tmp_dir)
+
+        entries = self.catalog.query()
+        self.assertEqual([e.scene_id for e in entries],
+                         ['scene%d' % i for i in xrange(4)])
+
+        entries = self.catalog.query(region=(95.1, 95.2, 21.1, 22.1))
+        self.assertEqual([e.scene_id for e in entries],
+                         ['scene1', 'scene2'])
+        self.assertAlmostEqual(entries[0].north, 21.3)
+        self.assertAlmostEqual(entries[0].east, 95.4)
+
+        entries = self.catalog.query(orbit_direction='Descending',
+                                     tmin=1.45e9 + 40. * day)
+        self.assertEqual([e.scene_id for e in entries], ['scene3'])
+
+        sc = entries[0].load()
+        self.assertEqual(sc.meta.scene_id, 'scene3')
+        self.assertEqual(sc.displacement.shape, (30, 40))
+
+
+if __name__ == '__main__':
+    unittest.main()
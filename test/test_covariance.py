@@ -5,6 +5,8 @@ from common import Benchmark
 from kite import Scene, SceneTest
 import matplotlib.pyplot as plt
 import os
+import shutil
+import tempfile
 
 benchmark = Benchmark()
 
@@ -44,6 +46,245 @@ class TestCovariance(unittest.TestCase):
                 num.testing.assert_allclose(c1, c2,
                                             rtol=200, atol=2e3, verbose=True)
 
+    def testCovarianceDeterministic(self):
+        cov = self.sc.covariance
+
+        d = []
+        for nthreads in (1, 2, 0):
+            cov.nthreads = nthreads
+            d.append(cov._calcCovarianceMatrix(method='full'))
+
+        for c in d[1:]:
+            num.testing.assert_equal(d[0], c)
+
+    def testCovariancePrecision(self):
+        cov = self.sc.covariance
+
+        d = []
+        for precision in ('exact', 'fast'):
+            cov.config.precision = precision
+            d.append(cov._calcCovarianceMatrix(method='full'))
+
+        num.testing.assert_allclose(d[0], d[1], rtol=1e-6)
+
+    def testCovarianceMonteCarlo(self):
+        cov = self.sc.covariance
+        cov.config.sampling_method = 'montecarlo'
+        cov.config.montecarlo_samples = 5000
+
+        c_mc = cov.covariance_matrix
+        c_err = cov.covariance_matrix_error
+        self.assertEqual(c_err.shape, c_mc.shape)
+        num.testing.assert_equal(c_mc, cov._calcCovarianceMatrix('full'))
+
+        cov.config.sampling_method = 'subsampling'
+        cov.config.adaptive_subsampling = False
+        c_full = cov._calcCovarianceMatrix(method='full')
+
+        valid = ~num.isnan(c_full)
+        self.assertTrue(num.all(
+            num.abs(c_mc - c_full)[valid] <= 6. * c_err[valid] + 1e-12))
+
+    def testPowerspecBinning(self):
+        cov = self.sc.covariance
+        nk = 64
+
+        for statistic in ('median', 'mean'):
+            cov.config.spectral_statistic = statistic
+            power, k, _, _, _, _ = cov._powerspecNoise(nk=nk)
+            self.assertEqual(power.shape, (nk,))
+            self.assertEqual(k.shape, (nk,))
+            self.assertTrue(num.all(num.isfinite(power)))
+            self.assertTrue(num.all(power >= 0.))
+
+    def testPowerspecFitCached(self):
+        cov = self.sc.covariance
+
+        fit = cov._powerspecFit()
+        self.assertIs(cov._powerspecFit(), fit)
+        self.assertIs(cov.powerspec_model, fit[0])
+
+        cov.noise_data = cov.noise_data
+        self.assertEqual(cov._powerspec_fit_cached, {})
+
+    def testStructureFunction(self):
+        from scipy.special import j0
+        cov = self.sc.covariance
+        struc_func, d = cov.structure_func
+        power_spec, k, _, _, _, _ = cov.powerspecNoise1D()
+        num.testing.assert_allclose(
+            struc_func[:5],
+            [2. * num.sum((1. - j0(k*dist)) * power_spec) for dist in d[:5]])
+        num.testing.assert_allclose(
+            cov.structureFunction(d, chunk_size=100), struc_func)
+
+        d2 = d[:20].reshape(4, 5)
+        self.assertEqual(cov.structureFunction(d2).shape, (4, 5))
+        num.testing.assert_allclose(cov.structureFunction(d2).ravel(),
+                                    struc_func[:20])
+
+    def testSyntheticNoiseBatch(self):
+        cov = self.sc.covariance
+        shape = (127, 64)
+
+        noise = cov.syntheticNoiseBatch(5, shape, seed=42)
+        self.assertEqual(noise.shape, (5, 128, 64))
+
+        noise_chunked = cov.syntheticNoiseBatch(5, shape, seed=42,
+                                                memory_limit=1)
+        num.testing.assert_equal(noise, noise_chunked)
+
+        noise32 = cov.syntheticNoiseBatch(5, shape, seed=42,
+                                          dtype=num.float32)
+        self.assertEqual(noise32.dtype, num.float32)
+        num.testing.assert_allclose(noise32, noise, rtol=1e-5, atol=1e-6)
+
+        num.testing.assert_equal(cov.syntheticNoise(shape, seed=42),
+                                 noise[0])
+
+    def testSyntheticNoiseLeafs(self):
+        cov = self.sc.covariance
+        nl = self.sc.quadtree.nleafs
+
+        noise = cov.syntheticNoiseLeafs(2000, seed=1)
+        self.assertEqual(noise.shape, (2000, nl))
+        num.testing.assert_equal(noise, cov.syntheticNoiseLeafs(2000, seed=1))
+
+        noise_lr = cov.syntheticNoiseLeafs(10, rank=5, seed=1,
+                                           dtype=num.float32)
+        self.assertEqual(noise_lr.shape, (10, nl))
+        self.assertEqual(noise_lr.dtype, num.float32)
+        self.assertIs(cov._noiseFactor(5, num.float32),
+                      cov._noiseFactor(5, num.float32))
+
+        var = num.diag(cov.covariance_matrix)
+        num.testing.assert_allclose(noise.var(axis=0), var, rtol=.2)
+
+    def testSelectNoiseNode(self):
+        cov = self.sc.covariance
+        nodes = self.sc.quadtree.nodes
+
+        node = cov.selectNoiseNode()
+        self.assertIn(node, nodes)
+
+        llr = num.array([n.llr for n in nodes])
+        llc = num.array([n.llc for n in nodes])
+        length = num.array([n.length for n in nodes])
+        std = num.array([n.std for n in nodes])
+        nan_fraction = num.array([n.nan_fraction for n in nodes])
+        for stat, ref in zip(self.sc.quadtree.node_statistics,
+                             (length, std, nan_fraction)):
+            num.testing.assert_equal(stat, ref)
+
+        scores = cov.noiseWindowScores(llr, llc, length, length)
+        num.testing.assert_allclose(
+            scores, cov._noiseScore(length, std, nan_fraction), atol=1e-6)
+        self.assertIs(node, nodes[int(num.argmax(
+            cov._noiseScore(length, std, nan_fraction)))])
+
+        # Non-aligned windows
+        idx = cov.selectNoiseWindow([3, 11], [7, 5], [40, 200], [90, 120])
+        self.assertIn(idx, (0, 1))
+
+    def testCovarianceAnisotropic(self):
+        cov = self.sc.covariance
+        a, b = cov.covariance_model
+
+        d_iso = [cov._calcCovarianceMatrix(method=m)
+                 for m in ('focal', 'full')]
+
+        cov.config.anisotropic = True
+        cov.config.model_anisotropic = num.array([a, b, b, 30.])
+        d_aniso = [cov._calcCovarianceMatrix(method=m)
+                   for m in ('focal', 'full')]
+
+        for c_iso, c_aniso in zip(d_iso, d_aniso):
+            num.testing.assert_allclose(c_iso, c_aniso, rtol=1e-10)
+
+        cov.config.model_anisotropic = None
+        a, b_major, b_minor, azimuth = cov.covariance_model_anisotropic
+        self.assertGreaterEqual(b_major, b_minor)
+        self.assertTrue(0. <= azimuth < 180.)
+
+        noise = cov.syntheticNoise((128, 128), anisotropic=True, seed=1)
+        self.assertEqual(noise.shape, (128, 128))
+        self.assertTrue(num.all(num.isfinite(noise)))
+
+    def testCovarianceAnisotropicAzimuth(self):
+        import scipy.optimize
+        cov = self.sc.covariance
+        a, b = cov.covariance_model
+
+        curve_fit = scipy.optimize.curve_fit
+        self.addCleanup(setattr, scipy.optimize, 'curve_fit', curve_fit)
+        scipy.optimize.curve_fit = \
+            lambda *args, **kwargs: ((a, b, b/2., -1e-15), None)
+
+        azimuth = cov._fitCovarianceAnisotropic()[-1]
+        self.assertTrue(0. <= azimuth < 180.)
+
+    def testLeafWeight(self):
+        cov = self.sc.covariance
+        leafs = self.sc.quadtree.leafs
+
+        for model, weight_mat in (('focal', cov.weight_matrix_focal),
+                                  ('full', cov.weight_matrix)):
+            num.testing.assert_allclose(
+                [cov.getLeafWeight(l, model=model) for l in leafs],
+                num.mean(weight_mat, axis=0), rtol=1e-6)
+
+        num.testing.assert_allclose([l.weight for l in leafs],
+                                    num.mean(cov.weight_matrix_focal, axis=0),
+                                    rtol=1e-6)
+
+    def testExportWeightMatrix(self):
+        cov = self.sc.covariance
+        tmpdir = tempfile.mkdtemp(prefix='kite')
+        self.addCleanup(shutil.rmtree, tmpdir)
+        nl = self.sc.quadtree.nleafs
+
+        exports = {}
+        for fmt in ('npy', 'triu', 'factor'):
+            fn = os.path.join(tmpdir, 'weights.%s.npy' % fmt)
+            cov.export_weight_matrix(fn, format=fmt, chunk_size=7)
+            exports[fmt] = num.load(fn, mmap_mode='r')
+
+        with open(fn + '.leafs') as f:
+            self.assertEqual(f.read().split(),
+                             [l.id for l in self.sc.quadtree.leafs])
+
+        weight_matrix = cov.weight_matrix
+        num.testing.assert_allclose(exports['npy'], weight_matrix,
+                                    rtol=1e-6, atol=1e-12)
+        num.testing.assert_allclose(exports['triu'],
+                                    weight_matrix[num.triu_indices(nl)],
+                                    rtol=1e-6, atol=1e-12)
+        num.testing.assert_allclose(
+            num.dot(exports['factor'].T, exports['factor']), weight_matrix,
+            rtol=1e-6, atol=1e-12)
+
+    def testExportWeightMatrixIndefinite(self):
+        cov = self.sc.covariance
+        tmpdir = tempfile.mkdtemp(prefix='kite')
+        self.addCleanup(shutil.rmtree, tmpdir)
+        nl = self.sc.quadtree.nleafs
+
+        eigvec = num.linalg.qr(num.random.rand(nl, nl))[0]
+        eigval = num.linspace(1., 10., nl)
+        eigval[:nl//4] *= -1.
+        cov.covariance_matrix = num.dot(eigvec * eigval, eigvec.T)
+
+        fn = os.path.join(tmpdir, 'weights.factor.npy')
+        cov.export_weight_matrix(fn, format='factor')
+        factor = num.load(fn)
+
+        positive = eigval > 0.
+        num.testing.assert_allclose(
+            num.dot(factor.T, factor),
+            num.dot(eigvec[:, positive] / eigval[positive],
+                    eigvec[:, positive].T),
+            rtol=1e-6, atol=1e-9)
+
     @benchmark
     @unittest.skip('Skip!')
     def testCovariancParallel(self):
@@ -39,6 +39,106 @@ class TestSyntheticScene(unittest.TestCase):
             qt.tile_size_min = 20
             qt.tile_size_max = s
 
+    def testFrameGrids(self):
+        frame = self.sc.frame
+        self.sc.displacement[:10, :20] = num.nan
+        self.sc.displacement = self.sc.displacement
+
+        gridE, gridN = frame.gridE, frame.gridN
+        shape = self.sc.displacement.shape
+        self.assertEqual(gridE.shape, shape)
+        self.assertEqual(gridN.shape, shape)
+        self.assertEqual(gridE.data.strides[0], 0)
+        self.assertEqual(gridN.data.strides[1], 0)
+
+        refE, refN = num.meshgrid(frame.E, frame.N)
+        num.testing.assert_equal(gridE.filled(), num.where(
+            num.isnan(self.sc.displacement), num.nan, refE))
+        num.testing.assert_equal(gridN.compressed(),
+                                 refN[~num.isnan(self.sc.displacement)])
+
+        mask = self.sc.displacement_mask.copy()
+        with self.assertRaises(ValueError):
+            gridE[-1, -1] = num.ma.masked
+        gridN.unshare_mask()
+        gridN[-1, -1] = num.ma.masked
+        self.assertTrue(gridN.mask[-1, -1])
+        num.testing.assert_equal(self.sc.displacement_mask, mask)
+        num.testing.assert_equal(gridE.mask, mask)
+
+    def testLookGeometry(self):
+        sc = self.sc
+        qt = sc.quadtree
+        self.assertEqual(sc.theta.shape, (sc.rows, 1))
+        self.assertEqual(sc.phi.shape, (1, sc.cols))
+
+        theta = sc.expandLook(sc.theta)
+        self.assertEqual(theta.shape, sc.displacement.shape)
+        num.testing.assert_allclose(
+            qt.leaf_thetas,
+            [num.median(theta[l._slice_rows, l._slice_cols]
+                        [~l.displacement_mask]) for l in qt.leafs])
+        self.assertEqual(sc.los.unitU.shape, (sc.rows, 1))
+        self.assertEqual(sc.los.unitE.shape, sc.displacement.shape)
+
+        sc = SceneTest.createGauss()
+        sc.setLogLevel('ERROR')
+        sc.theta = 1
+        sc.phi = num.pi / 2
+        self.assertIsInstance(sc.theta, float)
+        self.assertIsInstance(sc.los.unitU, float)
+        self.assertEqual(sc.thetaDeg, num.rad2deg(1.))
+        num.testing.assert_allclose(sc.quadtree.leaf_phis, num.pi / 2)
+
+    def testSinglePrecision(self):
+        sc = self.sc
+        self.addCleanup(setattr, sc, 'dtype', 'float64')
+        displacement = sc.displacement.copy()
+
+        sc.dtype = 'float32'
+        for arr in (sc.displacement, sc.theta, sc.phi,
+                    sc.los.unitE, sc.los.unitN, sc.los.unitU):
+            self.assertEqual(arr.dtype, num.float32)
+        num.testing.assert_equal(sc.displacement,
+                                 displacement.astype(num.float32))
+
+        sc.displacement = displacement
+        self.assertEqual(sc.displacement.dtype, num.float32)
+
+        for l in sc.quadtree.leafs:
+            self.assertIsInstance(l.std, num.float64)
+
+    def testDownsample(self):
+        from kite.scene_processing import Downsample
+        sc = self.sc
+        displ, theta, phi = sc.displacement, sc.theta, sc.phi
+        dLat, dLon = sc.frame.dLat, sc.frame.dLon
+        rows, cols = displ.shape
+        factor = 7
+        rr, rc = (rows - 1) // factor * factor, (cols - 1) // factor * factor
+
+        ds = Downsample(sc, factor=factor)
+        for statistic, func in (('mean', num.nanmean),
+                                ('median', num.nanmedian)):
+            ds.statistic = statistic
+            ds.apply()
+
+            self.assertEqual(sc.displacement.shape,
+                             (-(-rows // factor), -(-cols // factor)))
+            num.testing.assert_allclose(
+                sc.displacement[1, 2], func(displ[7:14, 14:21]))
+            num.testing.assert_allclose(
+                sc.displacement[-1, -1], func(displ[rr:, rc:]))
+            self.assertEqual(sc.theta.shape, (sc.rows, 1))
+            self.assertEqual(sc.phi.shape, (1, sc.cols))
+            self.assertAlmostEqual(sc.frame.dLon, dLon * factor)
+
+        ds.remove()
+        self.assertIs(sc.displacement, displ)
+        self.assertIs(sc.theta, theta)
+        self.assertIs(sc.phi, phi)
+        self.assertEqual(sc.frame.dLat, dLat)
+
     def testIO(self):
         import tempfile
         import shutil
@@ -70,6 +170,116 @@ class TestSyntheticScene(unittest.TestCase):
             self.assertEqual([l.id for l in sc1.quadtree.leafs],
                              [l.id for l in sc2.quadtree.leafs])
 
+            for layer in ('displacement', 'theta', 'phi'):
+                self.assertTrue(
+                    os.path.isfile('%s.%s.npy' % (file, layer)))
+            self.assertIsInstance(sc2.displacement, num.memmap)
+            num.testing.assert_equal(sc1.displacement, sc2.displacement)
+
+            sc3 = Scene()
+            sc3.setLogLevel('ERROR')
+            sc3.load('%s.displacement.npy' % file)
+            num.testing.assert_equal(sc1.displacement, sc3.displacement)
+
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def testIOLegacy(self):
+        import tempfile
+        import shutil
+
+        tmp_dir = tempfile.mkdtemp(prefix='kite')
+        file = os.path.join(tmp_dir, self.__class__.__name__)
+        sc1 = self.sc
+
+        try:
+            sc1.save_config('%s.yml' % file)
+            num.savez('%s.npz' % file, sc1.displacement, sc1.theta, sc1.phi)
+
+            sc2 = Scene()
+            sc2.setLogLevel('ERROR')
+            sc2.load('%s.npz' % file)
+            num.testing.assert_equal(sc1.displacement, sc2.displacement)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def testIOCovariance(self):
+        import tempfile
+        import shutil
+
+        tmp_dir = tempfile.mkdtemp(prefix='kite')
+        file = os.path.join(tmp_dir, self.__class__.__name__)
+        sc1 = self.sc
+        cov_matrix = sc1.covariance.covariance_matrix
+
+        try:
+            sc1.save(file)
+            self.assertIsNone(sc1.config.covariance.covariance_matrix)
+            self.assertTrue(os.path.isfile('%s.covariance.npy' % file))
+
+            sc2 = Scene()
+            sc2.setLogLevel('ERROR')
+            sc2.load(file)
+
+            cov_matrix2 = sc2.covariance.covariance_matrix
+            self.assertIsInstance(cov_matrix2, num.memmap)
+            num.testing.assert_equal(cov_matrix, cov_matrix2)
+            del cov_matrix2
+            sc2 = None
+
+            # A truncated sidecar is recalculated
+            sidecar = '%s.covariance.npy' % file
+            with open(sidecar, 'r+b') as f:
+                f.truncate(os.path.getsize(sidecar) // 2)
+
+            sc3 = Scene()
+            sc3.setLogLevel('CRITICAL')
+            sc3.load(file)
+
+            cov_matrix3 = sc3.covariance.covariance_matrix
+            self.assertNotIsInstance(cov_matrix3, num.memmap)
+            self.assertIsNone(sc3.covariance.config.covariance_matrix_file)
+            num.testing.assert_allclose(cov_matrix, cov_matrix3)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def testImportDetection(self):
+        import tempfile
+        import shutil
+        from kite import scene_io
+
+        tmp_dir = tempfile.mkdtemp(prefix='kite')
+        file = os.path.join(tmp_dir, 'roipac.unw')
+        nlines, nrows = 20, 30
+
+        try:
+            num.zeros((nlines, nrows*2), dtype='<f4').tofile(file)
+            with open(file + '.rsc', 'w') as rsc:
+                for k, v in (('WIDTH', nrows), ('FILE_LENGTH', nlines),
+                             ('X_FIRST', 96.), ('Y_FIRST', 22.),
+                             ('X_STEP', .001), ('Y_STEP', -.001),
+                             ('WAVELENGTH', .056)):
+                    rsc.write('%s %s\n' % (k, v))
+
+            self.assertTrue(scene_io.ROI_PAC.matchSignature(file))
+            self.assertFalse(scene_io.GMTSAR.matchSignature(file))
+
+            module = scene_io.detectFormat(file)
+            self.assertIsInstance(module, scene_io.ROI_PAC)
+            params = module._parseParameterFile(file + '.rsc')
+            params['WIDTH'] = 0
+            self.assertEqual(
+                module._parseParameterFile(file + '.rsc')['WIDTH'], nrows)
+            self.assertLessEqual(len(scene_io._discovery_cache),
+                                 scene_io.discovery_cache_size)
+
+            grd = os.path.join(tmp_dir, 'displacement.grd')
+            with open(grd, 'wb') as f:
+                f.write('CDF\x01')
+            self.assertTrue(scene_io.GMTSAR.matchSignature(grd))
+            with open(grd, 'wb') as f:
+                f.write('\x89HDF')
+            self.assertFalse(scene_io.GMTSAR.matchSignature(grd))
         finally:
             shutil.rmtree(tmp_dir)
 
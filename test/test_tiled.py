@@ -0,0 +1,79 @@
+import unittest
+import shutil
+import tempfile
+import numpy as num
+from kite import SceneTest, TiledArray
+
+
+class TestTiledArray(unittest.TestCase):
+
+    def setUp(self):
+        rstate = num.random.RandomState(123)
+        self.data = rstate.randn(300, 277)
+        self.data[rstate.rand(*self.data.shape) < .1] = num.nan
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='kite')
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def testSlicing(self):
+        for filename in (None, self.tmp_dir + '/tiled'):
+            tiled = TiledArray.fromArray(self.data, filename,
+                                         tile_shape=(64, 50), cache_size=1e5)
+            if filename is not None:
+                tiled = TiledArray.open(filename, cache_size=1e5)
+
+            num.testing.assert_equal(tiled[:, :], self.data)
+            num.testing.assert_equal(tiled[13:217, 49:151],
+                                     self.data[13:217, 49:151])
+            num.testing.assert_equal(tiled[5], self.data[5])
+            num.testing.assert_equal(tiled[:, -3], self.data[:, -3])
+            num.testing.assert_equal(num.asarray(tiled), self.data)
+
+    def testWrite(self):
+        filename = self.tmp_dir + '/tiled'
+        tiled = TiledArray.create(filename, self.data.shape,
+                                  tile_shape=(32, 32), cache_size=1e4)
+        self.assertTrue(num.all(num.isnan(tiled[:, :])))
+
+        tiled[100:120, 50:250] = 1.
+        tiled.flush()
+        tiled = TiledArray.open(filename)
+        self.assertEqual(num.sum(tiled[:, :] == 1.), 20 * 200)
+
+    def testStreaming(self):
+        tiled = TiledArray.fromArray(self.data, tile_shape=(64, 64),
+                                     cache_size=1e5)
+
+        count, mean, std = tiled.nanstats()
+        self.assertEqual(count, num.sum(~num.isnan(self.data)))
+        num.testing.assert_allclose(mean, num.nanmean(self.data))
+        num.testing.assert_allclose(std, num.nanstd(self.data))
+
+        factor = 3
+        nr, nc = self.data.shape[0] // factor, self.data.shape[1] // factor
+        blocks = self.data[:nr*factor, :nc*factor].reshape(
+            nr, factor, nc, factor).transpose(0, 2, 1, 3).reshape(nr, nc, -1)
+        num.testing.assert_allclose(tiled.downsample(factor),
+                                    num.nanmean(blocks, axis=2))
+        num.testing.assert_allclose(tiled.downsample(factor, 'median'),
+                                    num.nanmedian(blocks, axis=2))
+
+        mask = tiled.map(num.isnan, dtype=num.bool_)
+        num.testing.assert_equal(mask[:, :], num.isnan(self.data))
+
+    def testScene(self):
+        sc = SceneTest.createGauss()
+        sc.setLogLevel('ERROR')
+        displacement = sc.displacement.copy()
+        leafs = [l.id for l in sc.quadtree.leafs]
+
+        sc2 = SceneTest.createGauss()
+        sc2.setLogLevel('ERROR')
+        sc2.displacement = TiledArray.fromArray(displacement,
+                                                tile_shape=(128, 128))
+        self.assertEqual([l.id for l in sc2.quadtree.leafs], leafs)
+        self.assertIsInstance(sc2.covariance.noise_data, num.ndarray)
+
+
+if __name__ == '__main__':
+    unittest.main()